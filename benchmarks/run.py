@@ -0,0 +1,198 @@
+"""
+Benchmark suite for the simulation and sonification pipeline.
+
+Run all of the benchmarks and save the results:
+    python benchmarks/run.py --output results.json
+
+Compare against a saved baseline, exiting with status 1 if anything got
+slower (or used more memory) by more than the threshold:
+    python benchmarks/run.py --compare baseline.json --threshold 0.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+# run against the qSonify in this repository, even if it is not installed.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import qSonify
+from qSonify.qc import algorithms
+
+
+GATES = ("h(0)", "x(0)", "rz(.3, 0)", "cx(0, 1)", "crz(.3, 0, 1)",
+         "swap(0, 1)", "ccx(0, 1, 2)", "qft(0, 1, 2)")
+MAPS = {
+    "fermionic": qSonify.maps.fermionic(),
+    "scale": qSonify.maps.scale(),
+    "grandpiano": qSonify.maps.grandpiano(),
+    "stringquartet": qSonify.maps.stringquartet(),
+    "frequencymapping": qSonify.maps.frequencymapping(),
+}
+
+
+def measure(func, setup=lambda: None, repeat=5):
+    """
+    Time func and find its peak memory usage.
+
+    func: function, takes the output of setup.
+    setup: function, called before each run of func and not timed.
+    repeat: int, number of timed runs.
+
+    return: dict, median and min time in seconds and peak memory in bytes.
+    """
+    times = []
+    for _ in range(repeat):
+        arg = setup()
+        t0 = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - t0)
+
+    arg = setup()
+    tracemalloc.start()
+    func(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return dict(time=float(np.median(times)), min_time=min(times),
+                peak_memory=peak)
+
+
+def superposition(num_qubits):
+    """ Register in an equal superposition, so that every state is stored """
+    r = qSonify.Register(num_qubits)
+    r.apply_algorithm(algorithms.hadamard_tensor(num_qubits))
+    return r
+
+
+def benchmarks(directory, quick=False):
+    """
+    Generator that yields (name, func, setup, repeat) for every benchmark.
+
+    directory: str, directory for the benchmarks to write files to, ending
+                    with a path separator.
+    quick: bool, whether to only use small sizes.
+    """
+    sizes = (4, 8) if quick else (4, 8, 12)
+
+    for n in sizes:
+        for g in GATES:
+            gate = qSonify.gates.str_to_gate(g)
+            yield ("apply_gate/%s/%d" % (g, n), lambda r, gate=gate:
+                   r.apply_gate(gate), lambda n=n: superposition(n), 5)
+
+        yield ("get_prob_dist/%d" % n, lambda r: r.get_prob_dist(),
+               lambda n=n: superposition(n), 5)
+        yield ("sample/%d" % n, lambda r: list(r.sample(1000)),
+               lambda n=n: superposition(n), 5)
+
+    alg = algorithms.QFT(5) + ["rx(.7, 2)", "cx(2, 4)", "crz(.5, 1, 3)"]
+    for num_samples in (10, 100) if quick else (10, 100, 1000):
+        yield ("alg_to_song/%d" % num_samples, lambda _, s=num_samples:
+               qSonify.alg_to_song(alg, num_samples=s), lambda: None, 3)
+
+    np.random.seed(0)
+    res = [("{0:08b}").format(x) for x in np.random.randint(256, size=1000)]
+    for name, mapping in MAPS.items():
+        yield ("map/%s" % name, lambda _, m=mapping:
+               m(res, name="bench", tempo=100), lambda: None, 5)
+
+    for name, mapping in MAPS.items():
+        yield ("writeFile/%s" % name, lambda s: s.writeFile(directory),
+               lambda m=mapping, n=name: m(res, name=n, tempo=100), 5)
+
+    # many small songs, written as separate files and as one archive.
+    songs = [MAPS["scale"](res[i:i + 10], name="song%d" % i, tempo=100)
+             for i in range(200)]
+    yield ("writeFile/200 songs", lambda _: [
+        s.writeFile(directory) for s in songs
+    ], lambda: [setattr(s, "need_to_write", True) for s in songs], 3)
+    yield ("write_archive/200 songs", lambda _: qSonify.write_archive(
+        songs, os.path.join(directory, "songs.zip")
+    ), lambda: None, 3)
+
+
+def run(quick=False, pattern=""):
+    """
+    Run the benchmarks whose names contain pattern.
+
+    return: dict, with the environment under "meta" and the benchmark names
+            mapped to their measurements under "results".
+    """
+    np.random.seed(0)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, func, setup, repeat in benchmarks(directory + os.sep,
+                                                    quick):
+            if pattern not in name: continue
+            results[name] = measure(func, setup, repeat)
+            print("%-40s %10.3f ms %10.1f KiB" % (
+                name, 1000 * results[name]["time"],
+                results[name]["peak_memory"] / 1024
+            ))
+
+    meta = dict(
+        qSonify=qSonify.__version__, numpy=np.__version__,
+        python=platform.python_version(), platform=platform.platform(),
+        quick=quick, time=time.strftime("%Y-%m-%dT%H:%M:%S")
+    )
+    return dict(meta=meta, results=results)
+
+
+def compare(results, baseline, threshold=0.25):
+    """
+    Find the benchmarks that regressed relative to the baseline. Times are
+    compared by their minimum over the runs, which is the least noisy.
+
+    results: dict, output of run.
+    baseline: dict, output of run.
+    threshold: float, relative increase that counts as a regression.
+
+    return: list of tuples (name, metric, baseline value, new value).
+    """
+    regressions = []
+    for name, new in results["results"].items():
+        old = baseline["results"].get(name)
+        if old is None: continue
+        for metric in ("min_time", "peak_memory"):
+            if new[metric] > old[metric] * (1 + threshold):
+                regressions.append((name, metric, old[metric], new[metric]))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the qSonify pipeline."
+    )
+    parser.add_argument("--output", help="file to write the results to")
+    parser.add_argument("--compare", help="baseline results to compare to")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown that counts as a regression")
+    parser.add_argument("--quick", action="store_true",
+                        help="only run the small sizes")
+    parser.add_argument("--filter", default="",
+                        help="only run benchmarks whose names contain this")
+    args = parser.parse_args(args)
+
+    results = run(args.quick, args.filter)
+    if args.output:
+        with open(args.output, "w") as f: json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f: baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, metric, old, new in regressions:
+            print("REGRESSION %s %s: %g -> %g" % (name, metric, old, new))
+        if regressions: return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
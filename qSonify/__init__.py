@@ -1,8 +1,64 @@
-from qSonify.qc import *
-from qSonify import maps
-from qSonify.sonify import *
-from qSonify._qSonify import alg_to_song
+"""
+Submodules and the names they export are imported the first time they are
+used, so that importing qSonify (ie for the qsonify command) is fast.
+"""
+
+from importlib import import_module
 from ._version import __version__
 
+# name -> (module, attribute), where an attribute of None means the module.
+_lazy = dict(
+    qc=("qSonify.qc", None), sonify=("qSonify.sonify", None),
+    maps=("qSonify.maps", None), _qSonify=("qSonify._qSonify", None),
+    # submodules and names that "from qSonify.qc import *" and
+    # "from qSonify.sonify import *" used to export.
+    register=("qSonify.qc.register", None),
+    song=("qSonify.sonify.song", None),
+    methods=("qSonify.sonify.methods", None),
+    log2=("qSonify.sonify", "log2"), pow=("qSonify.sonify", "pow"),
+    **{name: ("qSonify.qc", name) for name in (
+        "gates", "Register", "algorithms", "Gate", "optimize",
+        "BatchRegister", "simulate_branches", "sample_branches",
+        "sample_shots", "noise", "Profiler", "CircuitSession"
+    )},
+    **{name: ("qSonify.sonify", name) for name in ("Song", "freq_to_note")},
+    **{name: ("qSonify.sonify.archive", name) for name in (
+        "ArchiveWriter", "ArchiveReader", "write_archive"
+    )},
+    **{name: ("qSonify._qSonify", name) for name in (
+        "alg_to_song", "markov_samples"
+    )},
+    **{name: ("qSonify._stream", name) for name in (
+        "SonificationStream", "FileSink", "SocketSink"
+    )},
+    **{name: ("qSonify._cache", name) for name in (
+        "SongCache", "circuit_hash", "song_key"
+    )},
+    SonificationServer=("qSonify._server", "SonificationServer"),
+    **{name: ("qSonify._analysis", name) for name in (
+        "transition_matrix", "sample_distributions",
+        "stationary_distribution", "mixing_time", "expected_histogram"
+    )}
+)
+
+__all__ = sorted(n for n in _lazy if not n.startswith("_")) + [
+    "state_to_decimal", "decimal_to_state", "__version__"
+]
+
+
+def __getattr__(name):
+    if name not in _lazy:
+        raise AttributeError("module 'qSonify' has no attribute %r" % name)
+    module, attribute = _lazy[name]
+    module = import_module(module)
+    value = module if attribute is None else getattr(module, attribute)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
+
+
 state_to_decimal = lambda s: int(s, base=2)
 decimal_to_state = lambda x, num_qubits: ("{0:0%db}" % num_qubits).format(x)
@@ -0,0 +1,4 @@
+import sys
+from qSonify._cli import main
+
+sys.exit(main())
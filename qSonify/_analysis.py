@@ -0,0 +1,141 @@
+"""
+Exact statistics of the Markov chain that alg_to_song samples from. Each
+sample of alg_to_song is found by preparing the previous sample as a basis
+state, applying the algorithm, and measuring. The chain is therefore given by
+the transition matrix P[a][b] = |<b| algorithm |a>|^2, and the first sample
+is drawn from the row of the all zero state.
+"""
+
+import numpy as np
+from qSonify import maps
+from qSonify.qc.gates import str_to_gate, MEASURE
+from qSonify.qc.batch import BatchRegister
+from qSonify.qc.branching import simulate_branches
+from qSonify.qc.algorithms import prepare_basis_state, num_qubits_required
+
+
+def transition_matrix(algorithm, num_qubits=None):
+    """
+    Find the transition matrix of the chain that alg_to_song samples from.
+    All 2^num_qubits initial basis states are simulated in one batch. If the
+    algorithm has mid-circuit measurements, then each initial state is
+    instead simulated exactly with simulate_branches.
+
+    algorithm: list of Gate objects and/or string gates.
+    num_qubits: int, number of qubits to run the algorithm on. If num_qubits
+                     is None, then it will run on the minimum required.
+
+    return: numpy array, P[a][b] is the probability that the next sample is
+            the state with decimal form b given that the last was a.
+    """
+    if num_qubits is None: num_qubits = num_qubits_required(algorithm)
+    algorithm = [str_to_gate(g) if isinstance(g, str) else g
+                 for g in algorithm]
+
+    if not any(isinstance(g, MEASURE) for g in algorithm):
+        batch = BatchRegister(np.eye(1 << num_qubits))
+        batch.apply_algorithm(algorithm)
+        return batch.probabilities()
+
+    P = np.zeros((1 << num_qubits, 1 << num_qubits))
+    for a in range(1 << num_qubits):
+        start = ("{0:0%db}" % num_qubits).format(a)
+        branches = simulate_branches(
+            prepare_basis_state(start) + algorithm, num_qubits
+        )
+        for probability, _, reg in branches:
+            for state, p in reg.get_prob_dist(decimal=True).items():
+                P[a][state] += probability * p
+    return P
+
+
+def sample_distributions(P, num_samples):
+    """
+    Find the distribution of each sample alg_to_song takes.
+
+    P: numpy array, transition matrix (see transition_matrix).
+    num_samples: int, number of samples.
+
+    return: numpy array of shape (num_samples, len(P)), row i is the
+            probability distribution of the ith sample.
+    """
+    dists = np.zeros((num_samples, len(P)))
+    if num_samples: dists[0] = P[0]
+    for i in range(1, num_samples): dists[i] = dists[i-1] @ P
+    return dists
+
+
+def stationary_distribution(P):
+    """
+    Find a stationary distribution pi = pi P of the chain. If the chain is
+    not irreducible the stationary distribution is not unique, and the least
+    squares solution is returned.
+
+    P: numpy array, transition matrix (see transition_matrix).
+
+    return: numpy array, probability of each state in decimal form.
+    """
+    n = len(P)
+    a = np.vstack((P.T - np.eye(n), np.ones((1, n))))
+    b = np.zeros(n + 1)
+    b[-1] = 1.0
+    pi = np.clip(np.linalg.lstsq(a, b, rcond=None)[0], 0, None)
+    return pi / pi.sum()
+
+
+def mixing_time(P, epsilon=0.25, max_steps=10000):
+    """
+    Find the mixing time of the chain, ie the smallest number of steps t such
+    that from any initial state the distribution after t steps is within
+    total variation distance epsilon of the stationary distribution.
+
+    P: numpy array, transition matrix (see transition_matrix).
+    epsilon: float, total variation distance threshold.
+    max_steps: int, give up after this many steps.
+
+    return: int, or None if the chain did not mix within max_steps (ie if it
+            is periodic).
+    """
+    pi, Pt = stationary_distribution(P), np.eye(len(P))
+    for t in range(max_steps + 1):
+        if 0.5 * np.abs(Pt - pi).sum(axis=1).max() <= epsilon: return t
+        Pt = Pt @ P
+    return None
+
+
+def expected_histogram(algorithm, num_qubits=None, num_samples=40,
+                       mapping=maps.default_map, by="pitch", tempo=100):
+    """
+    Find the exact expected histogram of the song that
+        alg_to_song(algorithm, num_qubits, num_samples, mapping)
+    would make, without sampling. The mapping is applied to each basis state
+    on its own, so this assumes that the mapping maps each sample
+    independently of the others, as all of the maps in qSonify.maps do.
+
+    algorithm: list of Gate objects and/or string gates.
+    num_qubits: int, number of qubits to run the algorithm on. If num_qubits
+                     is None, then it will run on the minimum required.
+    num_samples: int, number of samples to take from the quantum computer.
+    mapping: function, mapping from output to sound (see alg_to_song).
+    by: str, "pitch" to count each midi pitch, or "chord" to count each
+             tuple of midi pitches that sound for the same sample.
+    tempo: int, tempo passed to the mapping.
+
+    return: dict, midi pitches (or tuples of them) mapped to their expected
+            number of occurrences in the song.
+    """
+    if by not in ("pitch", "chord"):
+        raise ValueError("by must be 'pitch' or 'chord'")
+    if num_qubits is None: num_qubits = num_qubits_required(algorithm)
+    P = transition_matrix(algorithm, num_qubits)
+    counts = sample_distributions(P, num_samples).sum(axis=0)
+
+    histogram = {}
+    for x in np.flatnonzero(counts > 1e-12):
+        state = ("{0:0%db}" % num_qubits).format(x)
+        song = mapping([state], name="alg", tempo=tempo)
+        pitches = [e[1] for e in song.events]
+        keys = pitches if by == "pitch" else [tuple(sorted(pitches))]
+        for k in keys: histogram[k] = histogram.get(k, 0) + counts[x]
+
+    return histogram
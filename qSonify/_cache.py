@@ -0,0 +1,198 @@
+"""
+Content-addressed on-disk cache of rendered songs. Songs are keyed by a hash
+of the compiled circuit and every parameter of alg_to_song, including the
+seed, so a cached song is exactly the song that alg_to_song would make.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+from itertools import islice
+from qSonify import maps
+from qSonify._version import __version__
+from qSonify._qSonify import markov_samples
+from qSonify.qc.gates import str_to_gate
+
+
+def circuit_hash(algorithm):
+    """
+    Canonical hash of the circuit an algorithm compiles to. Equivalent ways
+    of writing the same gates, ie "cx(0, 1)" and "CX(0,1)", hash the same.
+
+    algorithm: list of Gate objects and/or string gates.
+    return: str, hex digest.
+    """
+    h = hashlib.sha256()
+    for g in algorithm:
+        if isinstance(g, str): g = str_to_gate(g)
+        h.update(type(g).__name__.encode())
+        h.update(repr(tuple(g.qubits)).encode())
+        # adding 0.0 turns -0.0 into 0.0 so that they hash the same.
+        u = np.round(np.asarray(g.unitary, dtype=np.complex128), 12) + 0.0
+        h.update(np.ascontiguousarray(u).tobytes())
+    return h.hexdigest()
+
+
+def mapping_key(mapping):
+    """
+    Describe a mapping function so that it can be part of a cache key. The
+    maps in qSonify.maps are closures, so they are described by their name
+    and the values they close over, ie the notes they use. A mapping can
+    override this by having a cache_key attribute.
+
+    mapping: function.
+    return: str.
+    """
+    if hasattr(mapping, "cache_key"): return str(mapping.cache_key)
+    cells = tuple(c.cell_contents for c in (mapping.__closure__ or ()))
+    return repr((getattr(mapping, "__module__", None),
+                 getattr(mapping, "__qualname__", repr(mapping)),
+                 getattr(mapping, "__defaults__", None), cells))
+
+
+def song_key(algorithm, num_qubits=None, num_samples=40,
+             mapping=maps.default_map, name="alg", tempo=100, seed=0):
+    """
+    Key that identifies the song that alg_to_song makes from its arguments.
+    See alg_to_song for the arguments.
+
+    return: str, hex digest.
+    """
+    params = dict(
+        circuit=circuit_hash(algorithm), num_qubits=num_qubits,
+        num_samples=num_samples, mapping=mapping_key(mapping), name=name,
+        tempo=tempo, seed=seed, version=__version__
+    )
+    return hashlib.sha256(
+        json.dumps(params, sort_keys=True).encode()
+    ).hexdigest()
+
+
+class SongCache:
+
+    def __init__(self, directory, max_bytes=1 << 28):
+        """
+        Cache rendered songs in a directory. Entries are written atomically
+        (to a temporary file that is then renamed), so several processes can
+        share the directory. When the cache grows past max_bytes, the least
+        recently used entries are evicted.
+
+        directory: str, directory to store the cache in.
+        max_bytes: int, maximum total size of the cache.
+        """
+        self.directory, self.max_bytes = directory, max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, algorithm, num_qubits=None, num_samples=40,
+            mapping=maps.default_map, name="alg", tempo=100, seed=0):
+        """
+        Find the cache key of a song. See song_key.
+
+        return: str, hex digest.
+        """
+        return song_key(algorithm, num_qubits, num_samples, mapping, name,
+                        tempo, seed)
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, key + extension)
+
+    def get(self, key):
+        """
+        Look up a song, and mark it as recently used.
+
+        key: str, see SongCache.key.
+        return: tuple (bytes, list), the midi file and the outcomes of the
+                quantum computer (or None if they were not stored). Or None
+                if the song is not in the cache.
+        """
+        try:
+            with open(self._path(key, ".mid"), "rb") as f: midi = f.read()
+            os.utime(self._path(key, ".mid"))
+        except FileNotFoundError: return None
+        try:
+            with open(self._path(key, ".json")) as f: outcomes = json.load(f)
+        except (FileNotFoundError, ValueError): outcomes = None
+        return midi, outcomes
+
+    def put(self, key, midi, outcomes=None):
+        """
+        Store a song, then evict old songs if the cache is too big.
+
+        key: str, see SongCache.key.
+        midi: bytes, the midi file.
+        outcomes: list of strs, the outcomes of the quantum computer, or None
+                  to not store them.
+        """
+        if outcomes is not None:
+            data = json.dumps(outcomes).encode()
+            self._write(self._path(key, ".json"), data)
+        self._write(self._path(key, ".mid"), midi)
+        self.evict()
+
+    def _write(self, path, data):
+        """ Atomically write data to path. """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f: f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+
+    def size(self):
+        """ return: int, total bytes of the entries in the cache. """
+        return sum(s for _, s, _ in self._entries())
+
+    def _entries(self):
+        """ return: list of tuples (key, bytes, last used time). """
+        entries = {}
+        for entry in os.scandir(self.directory):
+            key, extension = os.path.splitext(entry.name)
+            if extension not in (".mid", ".json"): continue
+            try: stat = entry.stat()
+            except FileNotFoundError: continue
+            size, used = entries.get(key, (0, 0.0))
+            if extension == ".mid": used = stat.st_mtime
+            entries[key] = size + stat.st_size, used
+        return [(k, s, t) for k, (s, t) in entries.items()]
+
+    def evict(self):
+        """ Remove the least recently used songs until the cache fits. """
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(s for _, s, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes: break
+            for extension in (".mid", ".json"):
+                try: os.remove(self._path(key, extension))
+                except FileNotFoundError: pass
+            total -= size
+
+    def alg_to_song(self, algorithm, num_qubits=None, num_samples=40,
+                    mapping=maps.default_map, name="alg", tempo=100, seed=0,
+                    store_outcomes=False):
+        """
+        Make the midi file of
+            alg_to_song(algorithm, num_qubits, num_samples, mapping, name,
+                        tempo, seed=seed)
+        or get it from the cache if it has already been made. If seed is
+        None, then the song is random, so it is neither looked up in nor
+        added to the cache.
+
+        store_outcomes: bool, whether to also cache the outcomes of the
+                              quantum computer.
+        return: bytes, the midi file.
+        """
+        if seed is not None:
+            key = self.key(algorithm, num_qubits, num_samples, mapping, name,
+                           tempo, seed)
+            cached = self.get(key)
+            if cached is not None: return cached[0]
+
+        res = list(islice(markov_samples(algorithm, num_qubits, seed=seed),
+                          num_samples))
+        midi = mapping(res, name=name, tempo=tempo).toBytes()
+        if seed is not None:
+            self.put(key, midi, res if store_outcomes else None)
+        return midi
@@ -0,0 +1,171 @@
+"""
+The qsonify command. Reads jobs (see qSonify._jobs), one JSON object per
+line, and writes each song to a midi file:
+    qsonify jobs.jsonl --output songs/ --workers 4
+    qsonify jobs.jsonl --archive songs.zip --workers 4
+    echo '{"algorithm": ["h(0)", "cx(0, 1)"], "name": "bell"}' | qsonify
+or serves songs over HTTP (see qSonify._server):
+    qsonify serve --port 8000 --workers 4
+
+Only what a job needs is imported, so that running one small job starts
+quickly. With more than one worker, jobs are read and files are written while
+other jobs are being simulated.
+"""
+
+import sys
+import json
+import argparse
+
+
+def read_jobs(files):
+    """
+    Generator that reads the jobs in JSONL files.
+
+    files: list of str, paths to read, where "-" is stdin.
+    yields: tuples (str, dict or Exception), where the job came from, ie
+            "jobs.jsonl:3", and the job or why it could not be read.
+    """
+    for path in files:
+        f = sys.stdin if path == "-" else open(path)
+        try:
+            for i, line in enumerate(f, 1):
+                if not line.strip(): continue
+                try: job = json.loads(line)
+                except ValueError as e: job = e
+                yield "%s:%d" % (path, i), job
+        finally:
+            if f is not sys.stdin: f.close()
+
+
+def _run_inline(jobs, func):
+    """ Run func on the jobs one at a time in this process. """
+    for where, job in jobs:
+        if isinstance(job, Exception): yield where, job, None
+        else:
+            try: yield where, None, func(job)
+            except Exception as e: yield where, e, None
+
+
+def _run_pool(jobs, func, workers):
+    """
+    Run func on the jobs in a pool of processes, yielding results as they
+    finish. At most two jobs per worker are in flight, so that jobs are read
+    as they are needed rather than all at once.
+    """
+    from concurrent.futures import (
+        ProcessPoolExecutor, wait, FIRST_COMPLETED
+    )
+    pending = {}
+    with ProcessPoolExecutor(workers) as executor:
+        for where, job in jobs:
+            if isinstance(job, Exception):
+                yield where, job, None
+                continue
+            pending[executor.submit(func, job)] = where
+            while len(pending) >= 2 * workers:
+                yield from _finished(pending, wait, FIRST_COMPLETED)
+        while pending: yield from _finished(pending, wait, FIRST_COMPLETED)
+
+
+def _finished(pending, wait, return_when):
+    done, _ = wait(pending, return_when=return_when)
+    for future in done:
+        where = pending.pop(future)
+        try: yield where, None, future.result()
+        except Exception as e: yield where, e, None
+
+
+def serve(args=None):
+    parser = argparse.ArgumentParser(
+        prog="qsonify serve",
+        description="Serve songs over HTTP. POST a JSON job to /song to get "
+                    "its midi file, and GET /metrics for the queue depth "
+                    "and latency."
+    )
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address to listen on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000,
+                        help="port to listen on (default 8000)")
+    parser.add_argument("-j", "--workers", type=int,
+                        help="number of worker processes (default: the "
+                             "number of CPUs)")
+    parser.add_argument("--cache", help="directory to cache songs in")
+    parser.add_argument("--max-qubits", type=int, default=10,
+                        help="most qubits that a job may use (default 10)")
+    parser.add_argument("--max-samples", type=int, default=1000,
+                        help="most samples that a job may take "
+                             "(default 1000)")
+    args = parser.parse_args(args)
+
+    import asyncio
+    from qSonify._server import SonificationServer
+    cache = None
+    if args.cache:
+        from qSonify._cache import SongCache
+        cache = SongCache(args.cache)
+    server = SonificationServer(args.host, args.port, args.workers,
+                                cache=cache, max_qubits=args.max_qubits,
+                                max_samples=args.max_samples)
+
+    async def run():
+        host, port = await server.start()
+        print("Serving on http://%s:%d" % (host, port), flush=True)
+        try: await server.serve_forever()
+        finally: await server.close()
+
+    try: asyncio.run(run())
+    except KeyboardInterrupt: pass
+    return 0
+
+
+def main(args=None):
+    if args is None: args = sys.argv[1:]
+    if args and args[0] == "serve": return serve(args[1:])
+
+    parser = argparse.ArgumentParser(
+        prog="qsonify",
+        description="Make midi files of quantum algorithms. Each line of "
+                    "the input is a JSON job, ie {\"algorithm\": [\"h(0)\", "
+                    "\"cx(0, 1)\"], \"mapping\": \"scale\", \"num_samples\": "
+                    "40, \"tempo\": 100, \"name\": \"bell\", \"seed\": 0}. "
+                    "Run qsonify serve to serve songs over HTTP instead."
+    )
+    parser.add_argument("jobs", nargs="*", default=["-"],
+                        help="JSONL files of jobs, or - for stdin (default)")
+    parser.add_argument("-o", "--output", default="",
+                        help="directory to write the midi files to")
+    parser.add_argument("-a", "--archive",
+                        help="zip archive to write all of the songs to, "
+                             "instead of a midi file each")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of worker processes (default 1)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="do not print the files that are written")
+    args = parser.parse_args(args)
+    if args.workers < 1: parser.error("--workers must be at least 1")
+
+    from functools import partial
+    from qSonify._jobs import write_job, render_job
+    func, archive = partial(write_job, output=args.output), None
+    if args.archive:
+        from qSonify.sonify.archive import ArchiveWriter
+        func, archive = render_job, ArchiveWriter(args.archive)
+
+    jobs = read_jobs(args.jobs)
+    if args.workers == 1: results = _run_inline(jobs, func)
+    else: results = _run_pool(jobs, func, args.workers)
+
+    failed = 0
+    try:
+        for where, error, result in results:
+            if error is None and archive is not None:
+                try: result = archive.add(result[1], result[0])
+                except ValueError as e: error = e
+            if error is not None:
+                failed += 1
+                print("%s: %s: %s" % (where, type(error).__name__, error),
+                      file=sys.stderr)
+            elif not args.quiet: print(result, flush=True)
+    finally:
+        if archive is not None: archive.close()
+    return 1 if failed else 0
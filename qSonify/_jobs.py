@@ -0,0 +1,249 @@
+"""
+Songs described as JSON, so that they can be made from the command line (see
+qSonify._cli) or sent over a network. A job is a dict such as
+    {"algorithm": ["h(0)", "cx(0, 1)", {"name": "QFT", "args": [0, 1]}],
+     "mapping": {"name": "scale", "kwargs": {"notes": ["c", "e", "g"]}},
+     "num_samples": 40, "tempo": 100, "name": "bell", "seed": 0}
+Only "algorithm" is required.
+"""
+
+import re
+import ast
+from qSonify import maps
+from qSonify.qc import algorithms, gates
+
+DEFAULTS = dict(mapping=None, num_qubits=None, num_samples=40, tempo=100,
+                name="alg", seed=None, output="")
+
+# the functions that jobs may call by name.
+ALGORITHMS = ("QFT", "IQFT", "GHZ", "U2", "U2dag", "hadamard_tensor",
+              "prepare_basis_state")
+MAPS = ("fermionic", "scale", "grandpiano", "stringquartet",
+        "frequencymapping")
+
+# str gates are eval'd by str_to_gate, so jobs may only use gates with
+# short arguments that are arithmetic on numbers and pi, ie "rz(pi/2, 0)",
+# without powers, which can take arbitrarily long to compute.
+_GATE = re.compile(r"\s*([A-Za-z]\w*)\s*\(([^()]*)\)\s*")
+_MAX_ARGUMENTS = 256
+_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.UAdd, ast.USub)
+# names become file names and HTTP headers, so they may not contain control
+# characters, quotes or path separators.
+_BAD_NAME = re.compile(r'[\x00-\x1f\x7f"/\\]')
+# the number of arguments of a gate that come before its qubits.
+_NUM_PARAMS = dict(CRZ=1, RX=1, RY=1, RZ=1, U3=3)
+
+
+def _named(spec, kind):
+    """
+    Split a spec that is either a name or {"name": ..., <kind>: ...}.
+
+    return: tuple (str, value of kind or None).
+    """
+    if isinstance(spec, str): return spec, None
+    if not isinstance(spec, dict) or "name" not in spec:
+        raise ValueError("expected a name or an object with a name, not %r"
+                         % (spec,))
+    return spec["name"], spec.get(kind)
+
+
+def _allowed(module, names, name):
+    """ Look up a function in a module, if its name is allowed. """
+    if name in names: return getattr(module, name)
+    raise ValueError("%s has no function %r, expected one of %s"
+                     % (module.__name__, name, ", ".join(names)))
+
+
+def _arithmetic(node):
+    """ Whether an expression is only arithmetic on numbers and pi. """
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return all(_arithmetic(x) for x in node.elts)
+    if isinstance(node, ast.Constant): return type(node.value) in (int, float)
+    if isinstance(node, ast.Name): return node.id in ("pi", "PI")
+    if isinstance(node, ast.UnaryOp):
+        return isinstance(node.op, _OPERATORS) and _arithmetic(node.operand)
+    if isinstance(node, ast.BinOp):
+        return (isinstance(node.op, _OPERATORS) and _arithmetic(node.left)
+                and _arithmetic(node.right))
+    return False
+
+
+def check_gate(gate):
+    """
+    Check that a str gate is a gate from qSonify.qc.gates with only numeric
+    arguments, so that it is safe to convert with str_to_gate.
+
+    gate: str, ie "cx(0, 1)".
+    return: str, the gate.
+    """
+    match = _GATE.fullmatch(gate)
+    if match is not None and len(match.group(2)) <= _MAX_ARGUMENTS:
+        try: args = ast.parse("[%s]" % match.group(2), mode="eval").body
+        except (SyntaxError, ValueError): args = None
+        cls = getattr(gates, match.group(1).upper(), None)
+        if (args is not None and _arithmetic(args) and isinstance(cls, type)
+                and issubclass(cls, gates.Gate)): return gate
+    raise ValueError("invalid gate %r" % (gate,))
+
+
+def gate_qubits(gate):
+    """
+    Find the qubits of a str gate without making its unitary.
+
+    gate: str, a gate that passes check_gate.
+    return: tuple, the qubits.
+    """
+    name, args = _GATE.fullmatch(gate).groups()
+    args = eval("[%s]" % args, {"__builtins__": {}},
+                dict(pi=gates.PI, PI=gates.PI))
+    return tuple(args[_NUM_PARAMS.get(name.upper(), 0):])
+
+
+def _check_size(value, max_qubits):
+    """
+    Check that the arguments of an algorithm from qSonify.qc.algorithms are
+    no bigger than max_qubits, so that making it is quick.
+    """
+    if isinstance(value, (list, tuple)):
+        for x in value: _check_size(x, max_qubits)
+    elif ((isinstance(value, int) and abs(value) > max_qubits)
+          or (isinstance(value, str) and len(value) > max_qubits)):
+        raise ValueError("algorithm argument %r is too big for %d qubits"
+                         % (value, max_qubits))
+
+
+def _check_qubits(gate, max_qubits):
+    """ Check that a str gate acts on qubits 0 to max_qubits - 1. """
+    for q in gate_qubits(gate):
+        if not isinstance(q, int) or not 0 <= q < max_qubits:
+            raise ValueError("%s acts on qubit %r, only %d qubits are allowed"
+                             % (gate, q, max_qubits))
+
+
+def parse_algorithm(spec, max_qubits=None):
+    """
+    Make the list of gates of an algorithm.
+
+    spec: list of str gates and/or algorithms from qSonify.qc.algorithms
+          (see ALGORITHMS), given as {"name": "QFT", "args": [0, 2]}. A single algorithm can
+          also be given on its own.
+    max_qubits: int, if max_qubits is not None, then gates may only act on
+                     qubits 0 to max_qubits - 1. This is checked before any
+                     unitary is made.
+    return: list of str gates.
+    """
+    if isinstance(spec, dict): spec = [spec]
+    if not isinstance(spec, list):
+        raise ValueError("algorithm must be a list, not %r" % (spec,))
+    algorithm = []
+    for g in spec:
+        if isinstance(g, str): new = [check_gate(g)]
+        else:
+            name, args = _named(g, "args")
+            builder = _allowed(algorithms, ALGORITHMS, name)
+            if max_qubits is not None: _check_size(args or (), max_qubits)
+            new = [check_gate(x) if isinstance(x, str) else x
+                   for x in builder(*(args or ()))]
+        if max_qubits is not None:
+            for x in new:
+                if isinstance(x, str): _check_qubits(x, max_qubits)
+        algorithm.extend(new)
+    return algorithm
+
+
+def parse_mapping(spec):
+    """
+    Make a mapping function.
+
+    spec: None for the default map, or the name of a map in qSonify.maps
+          (see MAPS), or {"name": "scale", "kwargs": {...}} to pass
+          arguments to the map.
+    return: function.
+    """
+    if spec is None: return maps.default_map
+    name, kwargs = _named(spec, "kwargs")
+    return _allowed(maps, MAPS, name)(**(kwargs or {}))
+
+
+def parse_job(job):
+    """
+    Check a job and fill in its defaults.
+
+    job: dict.
+    return: dict with every key of DEFAULTS and "algorithm".
+    """
+    if not isinstance(job, dict):
+        raise ValueError("a job must be an object, not %r" % (job,))
+    if "algorithm" not in job: raise ValueError("a job needs an algorithm")
+    unknown = set(job) - set(DEFAULTS) - {"algorithm"}
+    if unknown: raise ValueError("unknown job keys %s" % sorted(unknown))
+    job = dict(DEFAULTS, **job)
+    name = job["name"]
+    if not isinstance(name, str) or not name or _BAD_NAME.search(name):
+        raise ValueError("invalid name %r" % (name,))
+    return job
+
+
+def job_arguments(job, max_qubits=None, max_samples=None):
+    """
+    Convert a job to the arguments of alg_to_song.
+
+    job: dict.
+    max_qubits: int, if max_qubits is not None, then the job may use at most
+                     this many qubits.
+    max_samples: int, if max_samples is not None, then the job may take at
+                      most this many samples.
+    return: dict.
+    """
+    job = parse_job(job)
+    if (max_qubits is not None and job["num_qubits"] is not None
+            and job["num_qubits"] > max_qubits):
+        raise ValueError("num_qubits must be at most %d" % max_qubits)
+    if max_samples is not None and job["num_samples"] > max_samples:
+        raise ValueError("num_samples must be at most %d" % max_samples)
+    return dict(
+        algorithm=parse_algorithm(job["algorithm"], max_qubits),
+        num_qubits=job["num_qubits"], num_samples=job["num_samples"],
+        mapping=parse_mapping(job["mapping"]), name=job["name"],
+        tempo=job["tempo"], seed=job["seed"]
+    )
+
+
+def run_job(job):
+    """
+    Make the song of a job.
+
+    job: dict.
+    return: qSonify.Song object.
+    """
+    # imported here so that parsing jobs does not import the simulator.
+    from qSonify._qSonify import alg_to_song
+    return alg_to_song(**job_arguments(job))
+
+
+def render_job(job):
+    """
+    Make the song of a job as a midi file in memory.
+
+    job: dict.
+    return: tuple (str, bytes), the file name of the song and the midi file.
+    """
+    song = run_job(job)
+    return song.filename, song.toBytes()
+
+
+def write_job(job, output=""):
+    """
+    Make the song of a job and write it to a midi file. Runs in the worker
+    processes of the qsonify command.
+
+    job: dict.
+    output: str, directory to write to, used when the job does not have its
+                 own "output" directory.
+    return: str, path of the file that was written.
+    """
+    song = run_job(job)
+    path = job.get("output") or output
+    if path and not path.endswith(("/", "\\")): path += "/"
+    song.writeFile(path)
+    return path + song.filename
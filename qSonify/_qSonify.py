@@ -1,12 +1,26 @@
+import numpy as np
+from itertools import islice
 from qSonify import maps
-from qSonify.qc.register import Register
-from qSonify.qc.gates import str_to_gate
-from qSonify.qc.algorithms import prepare_basis_state
+from qSonify.qc.gates import str_to_gate, MEASURE
+from qSonify.qc.algorithms import prepare_basis_state, num_qubits_required
+from qSonify.qc.branching import simulate_branches, sample_branches
+from qSonify.qc.register import random_state
+from qSonify.qc.batch import BatchRegister, _to_state
+from qSonify.qc.noise import simulate_trajectories, noisy_prob_dist
+from qSonify.qc.profiler import phase
+from qSonify.qc.session import CircuitSession
+
+# algorithms without measurements or noise on at most _MAX_BATCH_QUBITS qubits
+# are simulated on many initial states at once, with at most
+# _BATCH_AMPLITUDES amplitudes in a batch.
+_MAX_BATCH_QUBITS, _BATCH_AMPLITUDES = 12, 1 << 20
 
 
 def alg_to_song(algorithm, num_qubits=None, 
                 num_samples=40, mapping=maps.default_map, 
-                name="alg", tempo=100):
+                name="alg", tempo=100, noise_model=None,
+                num_trajectories=100, profiler=None, seed=None,
+                processes=None):
     """
     Make a song from an algorithm. Markovian sample the algorithm, then map
     to a Song object.
@@ -16,6 +30,12 @@ def alg_to_song(algorithm, num_qubits=None,
                    "x(0)", 
                    qSonify.Gate(unitary=[[...], ...], qubits=(1, 2))
                   ]
+               The algorithm may contain mid-circuit measurements, ie 
+               "measure(0)"; see qSonify.qc.branching. Without them, and
+               without noise, the initial states that the song visits are
+               simulated together in BatchRegisters. It can also be a
+               qSonify.CircuitSession, which is simulated incrementally as
+               it is edited; then num_qubits and noise_model are not used.
     num_qubits: int, number of qubits to run each algorithm on. If num_qubits
                      is None, then it will run on the minimum required.
     num_samples: int, number of samples to take from the quantum computer,
@@ -27,9 +47,49 @@ def alg_to_song(algorithm, num_qubits=None,
                        a tempo of the song, and return a Song object.
     name: str, name of song.
     tempo: int, tempo of song.
+    noise_model: qSonify.qc.noise.NoiseModel object. If noise_model is not
+                 None, then the algorithm is simulated with noise using 
+                 num_trajectories Monte-Carlo wavefunction trajectories.
+    num_trajectories: int, number of trajectories per initial state when
+                           noise_model is not None.
+    profiler: qSonify.Profiler object. If profiler is not None, then the
+              "sample" phase (which contains a "simulate" phase and the 
+              gates for each new initial state) and the "map" phase are
+              recorded. Gates that run in other processes are not.
+    seed: int, seed for the random numbers so that the song is 
+               reproducible. If seed is None, then numpy's global random 
+               state is used.
+    processes: int, number of processes to split the trajectories of each 
+               initial state between when noise_model is not None. If 
+               processes is None, then run in this process.
                   
     returns: qSonify.Song object
     """
+    samples = markov_samples(algorithm, num_qubits, noise_model, 
+                             num_trajectories, profiler, seed, processes)
+    with phase(profiler, "sample"):
+        res = list(islice(samples, num_samples))
+    
+    with phase(profiler, "map"):
+        return mapping(res, name=name, tempo=tempo)
+
+
+def markov_samples(algorithm, num_qubits=None, noise_model=None,
+                   num_trajectories=100, profiler=None, seed=None,
+                   processes=None):
+    """
+    Generator that Markovian samples the algorithm forever. The first sample
+    is from the algorithm run on |0...0>, and each sample after that is from
+    the algorithm run on the previous sample. This is the chain that 
+    alg_to_song samples from; see alg_to_song for the arguments.
+    
+    yields: strs, "001", "110", ...
+    """
+    if isinstance(algorithm, CircuitSession):
+        if noise_model is not None:
+            raise ValueError("CircuitSession does not support noise")
+        yield from algorithm.markov_samples(seed)
+        return
     
     # don't need to convert from strings to gates here, because that is done
     # inside the Register class. But this saves the time of constantly
@@ -38,23 +98,84 @@ def alg_to_song(algorithm, num_qubits=None,
     for i, g in enumerate(algorithm):
         if isinstance(g, str): algorithm[i] = str_to_gate(g)
     
-    r = Register(num_qubits)
-    r.apply_algorithm(algorithm)
-    s = r.single_sample()
+    if num_qubits is None: num_qubits = num_qubits_required(algorithm)
+    rng = np.random if seed is None else np.random.RandomState(seed)
     
-    num_qubits = len(s) # in case num_qubits was None
+    if (noise_model is None and num_qubits <= _MAX_BATCH_QUBITS
+            and not any(isinstance(g, MEASURE) for g in algorithm)):
+        yield from _batch_samples(algorithm, num_qubits, profiler, rng)
+        return
     
-    registers = {"0"*num_qubits: r}
-    res = [s] + [""] * (num_samples - 1)
+    # samplers[start] yields samples of the algorithm run on |start>. Each
+    # one is simulated once, with measurements branched rather than sampled.
+    samplers, start = {}, "0"*num_qubits
     
-    for i in range(1, num_samples):
-        start = res[i-1]
-        if start not in registers: 
-            r = Register(num_qubits)
-            r.apply_algorithm(prepare_basis_state(start) + algorithm)
-            registers[start] = r
-        res[i] = registers[start].single_sample()
-            
-    return mapping(res, name=name, tempo=tempo)
+    while True:
+        if start not in samplers:
+            with phase(profiler, "simulate"):
+                samplers[start] = _sampler(
+                    algorithm, num_qubits, start, 
+                    noise_model, num_trajectories, profiler, rng, processes
+                )
+        start = next(samplers[start])
+        yield start
+
+
+def _batch_samples(algorithm, num_qubits, profiler, rng):
+    """
+    markov_samples for an algorithm without measurements or noise. When an
+    initial state is reached that has not been simulated, it is simulated in
+    a BatchRegister together with every other state that the last sample 
+    could have been and that has not been simulated, so that the gates are
+    applied once for many initial states.
+    """
+    # transitions[start] is the basis states (in decimal) that |start> can
+    # go to and their cumulative probabilities.
+    transitions, start, reachable = {}, "0"*num_qubits, ()
+    rows = max(1, _BATCH_AMPLITUDES >> num_qubits)
+    while True:
+        if start not in transitions:
+            others = (_to_state(x, num_qubits) for x in reachable)
+            starts = [start] + list(islice(
+                (s for s in others if s not in transitions and s != start),
+                rows - 1
+            ))
+            with phase(profiler, "simulate"):
+                batch = BatchRegister(starts)
+                batch.apply_algorithm(algorithm, profiler)
+                probs = batch.probabilities()
+                for s, p in zip(starts, probs):
+                    states = np.flatnonzero(p > 1e-16)
+                    transitions[s] = states, np.cumsum(p[states])
+        reachable, cumulative = transitions[start]
+        i = int(np.searchsorted(cumulative, rng.random() * cumulative[-1]))
+        start = _to_state(reachable[min(i, len(reachable) - 1)], num_qubits)
+        yield start
+
+
+def _sampler(algorithm, num_qubits, start, noise_model, num_trajectories,
+             profiler, rng, processes=None):
+    """ 
+    Simulate the algorithm run on |start>, and return a generator that yields
+    samples of it forever. See alg_to_song for the arguments.
+    """
+    if noise_model is None:
+        branches = simulate_branches(
+            prepare_basis_state(start) + algorithm, num_qubits, 
+            profiler=profiler
+        )
+        return (s for _, s in sample_branches(branches, None, rng=rng))
+    
+    trajectories = simulate_trajectories(
+        algorithm, noise_model, num_trajectories, num_qubits, start,
+        processes, seed=None if rng is np.random else rng.randint(1 << 31),
+        profiler=profiler
+    )
+    return _forever(noisy_prob_dist(trajectories), rng)
+
+
+def _forever(prob_dist, rng):
+    """ Generator that yields samples from prob_dist forever. """
+    while True: yield random_state(prob_dist, rng)
         
     
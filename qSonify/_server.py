@@ -0,0 +1,255 @@
+"""
+A small HTTP server that makes songs. POST a job (see qSonify._jobs) as JSON
+to /song and the midi file is sent back:
+    curl -d '{"algorithm": ["h(0)", "cx(0, 1)"], "seed": 0}' \\
+        http://127.0.0.1:8000/song > bell.mid
+Identical requests that arrive while a song is being made share the one
+computation. GET /metrics returns the queue depth and request latencies.
+"""
+
+import json
+import asyncio
+import hashlib
+from time import perf_counter
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from qSonify._jobs import parse_job, job_arguments, render_job
+from qSonify._cache import song_key
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large",
+            500: "Internal Server Error"}
+_CHUNK_SIZE = 1 << 16
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message=""):
+        super().__init__(message or _REASONS[status])
+        self.status = status
+
+
+class SonificationServer:
+
+    def __init__(self, host="127.0.0.1", port=8000, workers=None,
+                 executor=None, cache=None, max_body=1 << 20,
+                 max_qubits=10, max_samples=1000, latency_window=1000):
+        """
+        Serve songs over HTTP. Run it with
+            await server.start()
+            ...
+            await server.close()
+        or, from the shell, with qsonify serve.
+
+        host: str, address to listen on.
+        port: int, port to listen on, or 0 to pick a free port.
+        workers: int, number of processes to make songs in when executor is
+                      None. If workers is None, then it is the number of
+                      CPUs.
+        executor: concurrent.futures.Executor to make songs in. It is not
+                  shut down when the server closes.
+        cache: qSonify.SongCache object. If cache is not None, then seeded
+               songs are looked up in and added to it.
+        max_body: int, largest request body accepted, in bytes.
+        max_qubits: int, most qubits that a job may use.
+        max_samples: int, most samples that a job may take.
+        latency_window: int, number of recent requests that the latency
+                             metrics are computed over.
+        """
+        self.host, self.port, self.cache = host, port, cache
+        self.max_body, self.max_qubits = max_body, max_qubits
+        self.max_samples = max_samples
+        self._own_executor = executor is None
+        self.executor = executor or ProcessPoolExecutor(workers)
+        self._server, self._inflight = None, {}
+        self._latencies = deque(maxlen=latency_window)
+        self.counts = dict(requests=0, computed=0, coalesced=0, cached=0,
+                           errors=0)
+
+    async def start(self):
+        """
+        Start listening.
+
+        return: tuple (str, int), the host and port being listened on.
+        """
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port
+        )
+        self.host, self.port = self._server.sockets[0].getsockname()[:2]
+        return self.host, self.port
+
+    async def serve_forever(self):
+        if self._server is None: await self.start()
+        async with self._server: await self._server.serve_forever()
+
+    async def close(self):
+        """ Stop listening, and shut down the executor if it was made here. """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._own_executor: self.executor.shutdown(wait=False)
+
+    def metrics(self):
+        """
+        return: dict, with the number of songs being made ("queue_depth"),
+                the number of requests waiting for them ("waiting"), the
+                request counts, and the latency in seconds of recent
+                requests.
+        """
+        latencies = sorted(self._latencies)
+        percentile = lambda p: (
+            latencies[min(int(p * len(latencies)), len(latencies) - 1)]
+            if latencies else 0.0
+        )
+        return dict(
+            queue_depth=len(self._inflight),
+            waiting=sum(w for _, w in self._inflight.values()),
+            latency=dict(
+                count=len(latencies),
+                mean=sum(latencies) / len(latencies) if latencies else 0.0,
+                p50=percentile(.5), p95=percentile(.95),
+                max=latencies[-1] if latencies else 0.0
+            ),
+            **self.counts
+        )
+
+    async def song(self, job):
+        """
+        Make the song of a job, sharing the computation with any identical
+        job that is already being made.
+
+        job: dict.
+        return: tuple (str, bytes, bool), the file name of the song, the
+                midi file, and whether the computation was shared.
+        """
+        job = parse_job(job)
+        key = _job_key(job)
+        if key in self._inflight:
+            future, waiting = self._inflight[key]
+            self._inflight[key] = future, waiting + 1
+            self.counts["coalesced"] += 1
+            return (*await asyncio.shield(future), True)
+
+        future = asyncio.ensure_future(self._make(key, job))
+        self._inflight[key] = future, 1
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return (*await asyncio.shield(future), False)
+
+    async def _make(self, key, job):
+        loop = asyncio.get_running_loop()
+        # checking a job and hashing its circuit make unitaries, so they are
+        # done in a thread rather than on the event loop.
+        filename, key, cached = await loop.run_in_executor(
+            None, self._lookup, job
+        )
+        if cached is not None:
+            self.counts["cached"] += 1
+            return filename, cached
+
+        self.counts["computed"] += 1
+        filename, midi = await loop.run_in_executor(
+            self.executor, render_job, job
+        )
+        if key is not None:
+            await loop.run_in_executor(None, self.cache.put, key, midi)
+        return filename, midi
+
+    def _lookup(self, job):
+        """
+        Check a job against the limits of the server and look it up in the
+        cache.
+
+        job: dict.
+        return: tuple (str, str or None, bytes or None), the file name of the
+                song, its cache key if it can be cached, and the cached midi
+                file if there is one.
+        """
+        arguments = job_arguments(job, self.max_qubits, self.max_samples)
+        filename = "%s.mid" % arguments["name"]
+        # without a seed, every song is different, so it is not cached.
+        if self.cache is None or arguments["seed"] is None:
+            return filename, None, None
+        key = song_key(**arguments)
+        cached = self.cache.get(key)
+        return filename, key, None if cached is None else cached[0]
+
+    async def _handle(self, reader, writer):
+        """ Handle one HTTP request, then close the connection. """
+        start = perf_counter()
+        self.counts["requests"] += 1
+        try:
+            try:
+                method, path, body = await self._read_request(reader)
+                status, headers, body = await self._route(method, path, body)
+            except HTTPError as e:
+                status, headers, body = e.status, {}, _json(dict(error=str(e)))
+            except Exception as e:
+                status, headers = 500, {}
+                body = _json(dict(error="%s: %s" % (type(e).__name__, e)))
+            if status != 200: self.counts["errors"] += 1
+            await self._respond(writer, status, headers, body)
+            self._latencies.append(perf_counter() - start)
+        except (ConnectionError, asyncio.IncompleteReadError): pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """ return: tuple (str, str, bytes), method, path and body. """
+        try: method, path, _ = (await reader.readline()).decode().split()
+        except ValueError: raise HTTPError(400, "bad request line") from None
+        length = 0
+        while True:
+            line = (await reader.readline()).decode().strip()
+            if not line: break
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                try: length = int(value)
+                except ValueError: raise HTTPError(400) from None
+        if length > self.max_body: raise HTTPError(413)
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), path.split("?")[0], body
+
+    async def _route(self, method, path, body):
+        """ return: tuple (int, dict, bytes), status, headers and body. """
+        if path == "/metrics":
+            if method != "GET": raise HTTPError(405)
+            return 200, {}, _json(self.metrics())
+        if path != "/song": raise HTTPError(404)
+        if method != "POST": raise HTTPError(405)
+        try: job = json.loads(body.decode())
+        except ValueError: raise HTTPError(400, "body is not JSON") from None
+        try: filename, midi, shared = await self.song(job)
+        except (ValueError, TypeError, SyntaxError, NameError) as e:
+            # the job, or a gate in it, is invalid.
+            raise HTTPError(400, "%s: %s" % (type(e).__name__, e)) from None
+        return 200, {
+            "Content-Type": "audio/midi",
+            "Content-Disposition": 'attachment; filename="%s"' % filename,
+            "X-Coalesced": "true" if shared else "false"
+        }, midi
+
+    async def _respond(self, writer, status, headers, body):
+        headers.setdefault("Content-Type", "application/json")
+        head = ["HTTP/1.1 %d %s" % (status, _REASONS[status]),
+                "Content-Length: %d" % len(body), "Connection: close"]
+        head += ["%s: %s" % h for h in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode())
+        for i in range(0, len(body), _CHUNK_SIZE):
+            writer.write(body[i:i + _CHUNK_SIZE])
+            await writer.drain()
+        await writer.drain()
+
+
+def _json(obj):
+    return json.dumps(obj).encode()
+
+
+def _job_key(job):
+    """
+    Key of a checked job, from its canonical JSON, so that identical requests
+    can be found without making any unitaries.
+    """
+    job = {k: v for k, v in job.items() if k != "output"}
+    return hashlib.sha256(
+        json.dumps(job, sort_keys=True).encode()
+    ).hexdigest()
@@ -0,0 +1,194 @@
+"""
+Real-time sonification. The Markov chain that alg_to_song samples from is run
+in a background executor, each sample is mapped to notes as it arrives, and
+the notes are emitted as timestamped midi messages at the tempo of the song.
+"""
+
+import json
+import heapq
+import asyncio
+from itertools import islice
+from qSonify import maps
+from qSonify._qSonify import markov_samples
+
+
+class FileSink:
+
+    def __init__(self, f):
+        """
+        Write each event as a line of JSON, ie
+            {"time": 0.6, "message": [144, 60, 100]}
+        to a binary file object, such as an open file or sys.stdout.buffer
+        for a pipe.
+
+        f: binary file object.
+        """
+        self.f = f
+
+    async def send(self, time, message):
+        """
+        time: float, seconds since the start of the stream.
+        message: bytes, midi message.
+        """
+        self.f.write(_encode(time, message))
+        self.f.flush()
+
+
+class SocketSink:
+
+    def __init__(self, writer):
+        """
+        Write each event as a line of JSON (see FileSink) to a socket.
+
+        writer: asyncio.StreamWriter, ie from asyncio.open_connection.
+        """
+        self.writer = writer
+
+    async def send(self, time, message):
+        """
+        time: float, seconds since the start of the stream.
+        message: bytes, midi message.
+        """
+        self.writer.write(_encode(time, message))
+        await self.writer.drain()
+
+
+def _encode(time, message):
+    return (json.dumps(dict(time=round(time, 6), message=list(message)))
+            + "\n").encode()
+
+
+class JitterStats:
+
+    def __init__(self):
+        """ Statistics of how late events were emitted, in seconds. """
+        self.count, self.max = 0, 0.0
+        self.total, self.total_squared = 0.0, 0.0
+
+    def add(self, delay):
+        self.count += 1
+        self.total += delay
+        self.total_squared += delay * delay
+        self.max = max(self.max, delay)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def rms(self):
+        return (self.total_squared / self.count)**0.5 if self.count else 0.0
+
+    def as_dict(self):
+        return dict(count=self.count, mean=self.mean, rms=self.rms,
+                    max=self.max)
+
+
+class SonificationStream:
+
+    def __init__(self, algorithm, mapping=maps.default_map, num_qubits=None,
+                 num_samples=None, name="alg", tempo=100, buffer_size=16,
+                 executor=None, **kwargs):
+        """
+        Stream an algorithm as midi events in real time. Iterate over it with
+            async for time, message in stream: ...
+        or send the events to a sink with
+            await stream.run(sink)
+
+        Samples are simulated ahead of time in a background executor, and up
+        to buffer_size of them are buffered, so that simulating a new initial
+        state does not hold up the events.
+
+        algorithm: list of Gate objects and/or string gates.
+        mapping: function, mapping from output to sound (see alg_to_song).
+                 Each sample is mapped on its own.
+        num_qubits: int, see alg_to_song.
+        num_samples: int, number of samples to stream. If num_samples is
+                          None, then stream forever.
+        name: str, name passed to the mapping.
+        tempo: int, tempo of the song.
+        buffer_size: int, maximum number of samples to simulate ahead.
+        executor: concurrent.futures.ThreadPoolExecutor to simulate in. If
+                  executor is None, then the event loop's default executor
+                  is used.
+        kwargs: passed to markov_samples, ie noise_model.
+        """
+        self.mapping, self.name, self.tempo = mapping, name, tempo
+        self.num_samples, self.buffer_size = num_samples, buffer_size
+        self.executor, self.jitter = executor, JitterStats()
+        self.samples = markov_samples(algorithm, num_qubits, **kwargs)
+        if num_samples is not None:
+            self.samples = islice(self.samples, num_samples)
+
+    async def _produce(self, queue):
+        """
+        Simulate samples in the executor and put them in the queue. None is
+        put at the end, and an exception is put if simulating fails.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                sample = await loop.run_in_executor(
+                    self.executor, next, self.samples, None
+                )
+            except Exception as e: sample = e
+            await queue.put(sample)
+            if sample is None or isinstance(sample, Exception): return
+
+    def _events(self, sample, offset):
+        """
+        Map a sample to midi messages.
+
+        sample: str, sample from the algorithm.
+        offset: float, beat that the sample starts on.
+        return: tuple (list, float), the events (beat, priority, message) and
+                the number of beats the sample lasts.
+        """
+        song = self.mapping([sample], name=self.name, tempo=self.tempo)
+        events = []
+        for track, pitch, time, duration, volume in song.events:
+            channel = track % 16
+            events.append((offset + time, 1,
+                           bytes((0x90 | channel, pitch, volume))))
+            # note offs sort before note ons at the same time.
+            events.append((offset + time + duration, 0,
+                           bytes((0x80 | channel, pitch, 0))))
+        return events, max(song.time)
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self.buffer_size)
+        producer = asyncio.ensure_future(self._produce(queue))
+        seconds, pending, offset, start = 60.0 / self.tempo, [], 0.0, None
+        try:
+            while True:
+                sample = await queue.get()
+                if isinstance(sample, Exception): raise sample
+                if start is None: start = loop.time()
+                if sample is None: end = float("inf")
+                else:
+                    events, beats = self._events(sample, offset)
+                    for e in events: heapq.heappush(pending, e)
+                    offset = end = offset + beats
+
+                # emit everything that happens before the next sample starts.
+                while pending and pending[0][0] < end:
+                    beat, _, message = heapq.heappop(pending)
+                    when = start + beat * seconds
+                    await asyncio.sleep(max(when - loop.time(), 0))
+                    self.jitter.add(max(loop.time() - when, 0.0))
+                    yield beat * seconds, message
+                if sample is None: return
+        finally:
+            producer.cancel()
+
+    async def run(self, sink):
+        """
+        Send every event to the sink.
+
+        sink: object with a coroutine send(time, message), ie FileSink or
+              SocketSink.
+        return: dict, jitter statistics in seconds.
+        """
+        async for time, message in self: await sink.send(time, message)
+        return self.jitter.as_dict()
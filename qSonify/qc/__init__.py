@@ -1,4 +1,12 @@
 from qSonify.qc import gates
 from qSonify.qc.register import Register
 from qSonify.qc import algorithms
-Gate = gates.Gate
\ No newline at end of file
+Gate = gates.Gate
+from qSonify.qc.optimize import optimize
+from qSonify.qc.batch import BatchRegister
+from qSonify.qc.branching import (
+    simulate_branches, sample_branches, sample_shots
+)
+from qSonify.qc import noise
+from qSonify.qc.profiler import Profiler
+from qSonify.qc.session import CircuitSession
@@ -1,4 +1,5 @@
 import numpy as np
+from qSonify.qc.gates import str_to_gate
 
 def prepare_basis_state(state):
     """
@@ -10,6 +11,20 @@ def prepare_basis_state(state):
     return ["X(%d)" % i for i in range(len(state)) if state[i] == "1"]
 
 
+def num_qubits_required(algorithm):
+    """
+    Find the minimum number of qubits needed to run the algorithm.
+    
+    algorithm: list of Gate objects and/or string gates.
+    return: int.
+    """
+    return 1 + max(
+        (max((str_to_gate(g) if isinstance(g, str) else g).qubits)
+         for g in algorithm),
+        default=0
+    )
+
+
 def QFT(*endpoints):
     """ end is non inclusive """
     if len(endpoints) == 0: raise ValueError("Must provide qubits for fourier transform")
@@ -0,0 +1,187 @@
+import numpy as np
+from time import perf_counter
+from qSonify.qc.gates import str_to_gate, MEASURE
+from qSonify.qc.register import Register, get_sub_state
+
+
+_to_state = lambda x, num_qubits: ("{0:0%db}" % num_qubits).format(x)
+
+
+def _choose(probs, rng):
+    """
+    Pick an index from each row of probs.
+
+    probs: numpy array of shape (batch, n), each row is a distribution.
+    rng: object with a random(size) method, ie np.random.
+    return: numpy array of ints of shape (batch,).
+    """
+    cumulative = np.cumsum(probs, axis=1)
+    r = rng.random(len(probs)) * cumulative[:, -1]
+    indices = (cumulative < r[:, None]).sum(axis=1)
+    return np.minimum(indices, probs.shape[1] - 1)
+
+
+def _apply_matrix(state, matrix, qubits):
+    """
+    Apply a matrix to the qubits of every state in a batch.
+
+    state: numpy array of shape (batch, 2^n).
+    matrix: numpy array of shape (2^k, 2^k), acting on qubits in order.
+    qubits: tuple of k ints.
+    return: numpy array of shape (batch, 2^n).
+    """
+    b, n, k = len(state), int(np.log2(state.shape[1])), len(qubits)
+    # axis 0 is the batch, axis 1 + q is qubit q.
+    psi = state.reshape((b,) + (2,) * n)
+    u = np.asarray(matrix).reshape((2,) * 2 * k)
+    axes = [1 + q for q in qubits]
+    psi = np.tensordot(u, psi, axes=(list(range(k, 2 * k)), axes))
+    psi = np.moveaxis(psi, list(range(k)), axes)
+    return np.ascontiguousarray(psi).reshape(b, 1 << n)
+
+
+class BatchRegister:
+
+    def __init__(self, initial_states):
+        """
+        Initialize a batch of registers, each in its own initial state. The
+        state of the batch is stored as a dense (batch, 2^num_qubits) numpy
+        array, so that applying a gate evolves every member of the batch with
+        a single vectorized operation.
+
+        initial_states: list of strs, basis states to start each member of
+                        the batch in, ie ["000", "010", "111"]. Or a numpy
+                        array of shape (batch, 2^num_qubits) of amplitudes.
+        """
+        if isinstance(initial_states, np.ndarray):
+            self.state = np.array(initial_states, dtype=np.complex128)
+            self.num_qubits = int(np.log2(self.state.shape[1]))
+            if self.state.shape[1] != 1 << self.num_qubits:
+                raise ValueError("State dimension must be a power of 2")
+        else:
+            initial_states = list(initial_states)
+            if not initial_states:
+                raise ValueError("Must provide at least one initial state")
+            self.num_qubits = len(initial_states[0])
+            self.state = np.zeros(
+                (len(initial_states), 1 << self.num_qubits),
+                dtype=np.complex128
+            )
+            for i, s in enumerate(initial_states):
+                self.state[i][int(s, base=2)] = 1.0
+
+    def __len__(self):
+        return len(self.state)
+
+    def apply_gate(self, gate):
+        """
+        apply Gate object to every register in the batch
+
+        gate: Gate object or str gate.
+        return: None.
+        """
+        if isinstance(gate, str): gate = str_to_gate(gate)
+        if max(gate.qubits) >= self.num_qubits:
+            raise ValueError("Gate operates on non initialized qubit")
+        if isinstance(gate, MEASURE):
+            self.measure(gate.qubits)
+            return
+
+        self.state = _apply_matrix(self.state, gate.unitary, gate.qubits)
+
+    def apply_algorithm(self, algorithm, profiler=None):
+        """
+        Apply the algorithm to every register in the batch. Strings are only
+        converted to gates once for the whole batch.
+
+        algorithm: list of Gate objects and/or string gates.
+        profiler: qSonify.Profiler object. If profiler is not None, then the
+                  time, number of nonzero amplitudes and bytes held are
+                  recorded for each gate.
+        return: None
+        """
+        if profiler is None:
+            for gate in algorithm: self.apply_gate(gate)
+            return
+
+        for gate in algorithm:
+            start = perf_counter()
+            self.apply_gate(gate)
+            profiler.record_gate(
+                gate, start, perf_counter() - start,
+                np.count_nonzero(self.state), self.state.nbytes
+            )
+
+    def probabilities(self):
+        """
+        return: numpy array of shape (batch, 2^num_qubits), the probability
+                of measuring each basis state for each register.
+        """
+        return np.abs(self.state)**2
+
+    def get_prob_dist(self, index, qubits=None, decimal=False):
+        """
+        Get the probability distribution for measuring the qubits of one
+        register in the batch. See Register.get_prob_dist.
+
+        index: int, which register in the batch.
+        qubits: tuple, qubits for the distrubution. If qubits is None, then
+                       will find the distribution over all the qubits.
+        decimal: bool, whether to represents states in qubits (binary) form or
+                       decimal form.
+        return: dict, states mapped to probabilities.
+        """
+        probs, prob_dist = self.probabilities()[index], {}
+        for x in np.flatnonzero(probs > 1e-16):
+            s = _to_state(x, self.num_qubits)
+            if qubits is not None: s = get_sub_state(s, qubits)
+            if decimal: s = int(s, base=2)
+            prob_dist[s] = prob_dist.get(s, 0) + probs[x]
+        return prob_dist
+
+    def single_samples(self, rng=np.random):
+        """
+        Take one sample from every register in the batch at once without
+        collapsing them.
+
+        rng: object with a random(size) method, ie np.random.
+        return: list of strs, one state for each register in the batch.
+        """
+        indices = _choose(self.probabilities(), rng)
+        return [_to_state(x, self.num_qubits) for x in indices]
+
+    def measure(self, qubits, rng=np.random):
+        """
+        Measure the qubits of every register in the batch, collapsing each one
+        onto its own random outcome.
+
+        qubits: tuple, qubits to measure.
+        rng: object with a random(size) method, ie np.random.
+        return: list of strs, the outcome for each register in the batch.
+        """
+        n, k = self.num_qubits, len(qubits)
+        # outcome[x] is the decimal outcome of measuring basis state x.
+        x, outcome = np.arange(1 << n), np.zeros(1 << n, dtype=int)
+        for q in qubits: outcome = (outcome << 1) | ((x >> (n - 1 - q)) & 1)
+
+        state_probs = self.probabilities()
+        probs = np.zeros((len(self), 1 << k))
+        for o in range(1 << k):
+            probs[:, o] = state_probs[:, outcome == o].sum(axis=1)
+        chosen = _choose(probs, rng)
+
+        keep = outcome[None, :] == chosen[:, None]
+        norm = np.sqrt(probs[np.arange(len(self)), chosen])
+        self.state = np.where(keep, self.state / norm[:, None], 0.0)
+        return [_to_state(o, k) for o in chosen]
+
+    def register(self, index):
+        """
+        index: int, which register in the batch.
+        return: Register object in the same state as that member of the batch.
+        """
+        reg = Register(self.num_qubits)
+        reg.clear()
+        for x in np.flatnonzero(np.abs(self.state[index])**2 >= 1e-16):
+            reg[_to_state(x, self.num_qubits)] = self.state[index][x]
+        return reg
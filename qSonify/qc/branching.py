@@ -0,0 +1,120 @@
+import numpy as np
+from time import perf_counter
+from qSonify.qc.gates import str_to_gate, MEASURE
+from qSonify.qc.register import Register, random_state
+from qSonify.qc.algorithms import num_qubits_required
+from qSonify.qc.profiler import register_nbytes
+
+
+def simulate_branches(algorithm, num_qubits=None, tolerance=1e-12,
+                      profiler=None):
+    """
+    Simulate an algorithm that contains mid-circuit measurements (MEASURE
+    gates) exactly. Instead of collapsing onto a random outcome, the state is
+    branched at each measurement into one register per possible outcome. The
+    gates before a measurement are only applied once, and are shared by every
+    branch that comes after it.
+
+    algorithm: list of Gate objects and/or string gates. Example:
+                  ["h(0)", "measure(0)", "cx(0, 1)"]
+    num_qubits: int, number of qubits to run the algorithm on. If num_qubits
+                     is None, then it will run on the minimum required.
+    tolerance: float, branches less likely than this are dropped.
+    profiler: qSonify.Profiler object. If profiler is not None, then each
+              gate is recorded with totals over all branches.
+
+    return: list of tuples (probability, outcomes, register). probability is
+            the probability of the branch, outcomes is the tuple of strs
+            measured at each MEASURE gate in order, and register is the
+            Register object at the end of the algorithm on that branch.
+    """
+    if num_qubits is None: num_qubits = num_qubits_required(algorithm)
+    branches = [(1.0, (), Register(num_qubits))]
+    for gate in algorithm:
+        if profiler is not None:
+            pruned, start = sum(b[2].pruned for b in branches), perf_counter()
+
+        if isinstance(gate, str): gate = str_to_gate(gate)
+        if not isinstance(gate, MEASURE):
+            for _, _, reg in branches: reg.apply_gate(gate)
+        else: branches = _branch(branches, gate.qubits, tolerance)
+
+        if profiler is not None:
+            profiler.record_gate(
+                gate, start, perf_counter() - start,
+                sum(len(b[2]) for b in branches),
+                sum(register_nbytes(b[2]) for b in branches),
+                # measuring copies registers rather than pruning them.
+                0 if isinstance(gate, MEASURE)
+                else sum(b[2].pruned for b in branches) - pruned
+            )
+
+    return branches
+
+
+def _branch(branches, qubits, tolerance):
+    """ Split each branch into one branch per outcome of measuring qubits """
+    new_branches = []
+    for probability, outcomes, reg in branches:
+        prob_dist = reg.get_prob_dist(qubits)
+        for state, p in prob_dist.items():
+            if probability * p < tolerance: continue
+            r = reg if len(prob_dist) == 1 else reg.duplicate()
+            r.collapse(state, qubits, p)
+            new_branches.append((probability * p, outcomes + (state,), r))
+    return new_branches
+
+
+def sample_branches(branches, num_samples=1, qubits=None, rng=np.random):
+    """
+    Generator that yields samples from the branches of an algorithm, as if
+    the algorithm was run num_samples times and then measured.
+
+    branches: list, output of simulate_branches.
+    num_samples: int, number of samples to take. If num_samples is None,
+                      then samples are yielded forever.
+    qubits: tuple, qubits to measure at the end. If qubits is None, then use
+                   all.
+    rng: object with a random() method, ie np.random.
+
+    yields: tuples (outcomes, state), the mid-circuit outcomes of the branch
+            that was sampled, and the final measurement of it.
+    """
+    weights = np.cumsum([b[0] for b in branches])
+    prob_dists = [None] * len(branches)
+    count = 0
+    while num_samples is None or count < num_samples:
+        count += 1
+        i = min(
+            int(np.searchsorted(weights, rng.random() * weights[-1])),
+            len(branches) - 1
+        )
+        if prob_dists[i] is None:
+            prob_dists[i] = branches[i][2].get_prob_dist(qubits)
+        yield branches[i][1], random_state(prob_dists[i], rng)
+
+
+def sample_shots(algorithm, num_shots, num_qubits=None, qubits=None,
+                 rng=np.random):
+    """
+    Run an algorithm with mid-circuit measurements num_shots times. The
+    algorithm is simulated once per distinct branch rather than once per
+    shot; see simulate_branches.
+
+    algorithm: list of Gate objects and/or string gates.
+    num_shots: int, number of shots.
+    num_qubits: int, number of qubits to run the algorithm on. If num_qubits
+                     is None, then it will run on the minimum required.
+    qubits: tuple, qubits to measure at the end. If qubits is None, then use
+                   all.
+    rng: object with a random() method, ie np.random.
+
+    return: dict, maps tuples (outcomes, state) to the number of shots that
+            gave them. See sample_branches.
+    """
+    counts = {}
+    branches = simulate_branches(algorithm, num_qubits)
+    for shot in sample_branches(branches, num_shots, qubits, rng):
+        counts[shot] = counts.get(shot, 0) + 1
+    return counts
+
@@ -1,5 +1,7 @@
 import numpy as np
-from scipy.linalg import expm
+from threading import Lock
+from functools import lru_cache
+from collections import OrderedDict
 
 exp, PI, cos, sin, sqrt = np.exp, np.pi, np.cos, np.sin, np.sqrt
 
@@ -7,21 +9,130 @@ sigma_x = [[0, 1], [1, 0]]
 sigma_y = [[0, -1j], [1j, 0]]
 sigma_z = [[1, 0], [0, -1]]
 
-array = lambda x: np.array(x, dtype=np.complex)
+array = lambda x: np.array(x, dtype=np.complex128)
 
 
-class Gate:
+def _frozen(matrix):
+    """ Copy matrix to a read only complex array, so that it can be shared """
+    u = array(matrix)
+    u.setflags(write=False)
+    return u
+
+
+_registry = lru_cache(maxsize=4096)(
+    lambda cls, args: _frozen(cls.matrix(*args))
+)
+# the registry counts unitaries, not bytes, so the unitaries of gates on more
+# qubits than this are made for each gate instead of being kept.
+_MAX_INTERNED_QUBITS = 6
+
+
+def _interned(cls, args):
+    """
+    Registry of the unitaries of gates with parameters, so that every gate
+    of the same type and parameters shares one read only matrix. Only the
+    most recently used unitaries are kept.
+
+    cls: Gate subclass with a matrix function.
+    args: tuple, arguments of cls.matrix.
+    return: read only numpy array.
+    """
+    try: hash(args)
+    except TypeError: return _frozen(cls.matrix(*args))
+    return _registry(cls, args)
+
+
+def _sized(cls, num_qubits):
+    """
+    The unitary of a gate that acts on any number of qubits, ie QFT. Only
+    small ones are interned.
+
+    cls: Gate subclass with a matrix function of the number of qubits.
+    num_qubits: int.
+    return: read only numpy array.
+    """
+    if num_qubits > _MAX_INTERNED_QUBITS: return _frozen(cls.matrix(num_qubits))
+    return _interned(cls, (num_qubits,))
+
+
+def _restore(cls, unitary, qubits, params):
+    """ Unpickle a Gate that can not be remade from its parameters. """
+    gate = object.__new__(cls)
+    gate._init(_frozen(unitary), qubits, params)
+    return gate
+
+
+class _GateType(type):
+
+    @property
+    def unitary(cls):
+        """
+        The class level unitary of a gate, ie X.unitary, which is its matrix
+        (or the function of the parameters that makes it), or the unitary
+        attribute of a subclass that defines one. Read only.
+        """
+        slot = Gate.__dict__["unitary"]
+        for c in cls.__mro__:
+            if c.__dict__.get("unitary", slot) is not slot:
+                return c.__dict__["unitary"]
+            if "matrix" in c.__dict__: return c.matrix
+        return slot
+
+
+class Gate(metaclass=_GateType):
+    """
+    Gates are immutable. Subclasses with a matrix attribute (a matrix, or a
+    function of the parameters) share their unitary between every gate of
+    the same type and parameters, and are pickled as just their parameters
+    and qubits, so their constructor takes the parameters then the qubits.
+    """
+    __slots__ = "unitary", "qubits", "params"
+    str = "Unitary"
 
     def __init__(self, unitary, qubits):
         """
         unitary: list of list representing unitary matrix
         qubits: tuple in order of qubits that unitary acts on
         """
-        self.unitary, self.qubits = array(unitary), qubits
-        self.dimension, self.num_qubits = len(unitary), len(qubits)
-        self.str = "Unitary"
-        if self.dimension != 1 << self.num_qubits:
+        unitary = _frozen(unitary)
+        if len(unitary) != 1 << len(qubits):
             raise ValueError("Gate untary must be 2^n x 2^n")
+        self._init(unitary, qubits)
+
+    def _init(self, unitary, qubits, params=()):
+        object.__setattr__(self, "unitary", unitary)
+        object.__setattr__(self, "qubits", tuple(qubits))
+        object.__setattr__(self, "params", params)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Gate objects are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Gate objects are immutable")
+
+    @property
+    def dimension(self):
+        return len(self.unitary)
+
+    @property
+    def num_qubits(self):
+        return len(self.qubits)
+
+    def __eq__(self, other):
+        if not isinstance(other, Gate): return NotImplemented
+        return (type(self) is type(other) and self.qubits == other.qubits
+                and self.params == other.params
+                and (self.unitary is other.unitary
+                     or np.array_equal(self.unitary, other.unitary)))
+
+    def __hash__(self):
+        return hash((type(self), self.qubits, self.params))
+
+    def __reduce__(self):
+        if hasattr(type(self), "matrix"):
+            return type(self), self.params + self.qubits
+        return _restore, (type(self), np.asarray(self.unitary), self.qubits,
+                          self.params)
 
     def __getitem__(self, item):
         """ Gate[i][j] gets the (i, j) element of the unitary matrix """
@@ -50,12 +161,12 @@ class Gate:
     def __pow__(self, power):
         return Gate([list(x) for x in np.array(self.unitary)**power],
                     self.qubits)
-        
+
     def __str__(self):
         s = str(self.qubits)
         if len(self.qubits) == 1: s = s.replace(",", "")
         return self.str + str(self.qubits)
-    
+
     def __repr__(self):
         return str(self)
 
@@ -63,22 +174,26 @@ class Gate:
     #     """ self * other """
 
 
+# the angle of a rotation gate.
+_angle = property(lambda self: self.params[0])
 
 
 class H(Gate):
+    __slots__ = ()
     c = 1.0/2.0**0.5
-    unitary = array([
+    matrix = _frozen([
         [c, c],
         [c, -c]
     ])
     def __init__(self, qubit):
-        super().__init__(H.unitary, (qubit,))
+        self._init(H.matrix, (qubit,))
 
     def __str__(self):
         return "H(%d)" % self.qubits[0]
 
 class CX(Gate):
-    unitary = array([
+    __slots__ = ()
+    matrix = _frozen([
         [1, 0, 0, 0],
         [0, 1, 0, 0],
         [0, 0, 0, 1],
@@ -86,63 +201,70 @@ class CX(Gate):
     ])
     def __init__(self, control_qubit, target_qubit):
         # qubits should be tuple (control, target)
-        super().__init__(CX.unitary, (control_qubit, target_qubit))
+        self._init(CX.matrix, (control_qubit, target_qubit))
 
     def __str__(self):
         return "CX" + str(self.qubits)
-    
+
 class CCX(Gate):
-    unitary = np.eye(8, dtype=np.complex)
-    unitary[7][7], unitary[6][6] = 0, 0
-    unitary[7][6], unitary[6][7] = 1, 1
+    __slots__ = ()
+    matrix = np.eye(8, dtype=np.complex128)
+    matrix[7][7], matrix[6][6] = 0, 0
+    matrix[7][6], matrix[6][7] = 1, 1
+    matrix = _frozen(matrix)
     def __init__(self, control_qubit0, control_qubit1, target_qubit):
         # qubits should be tuple (control, target)
-        super().__init__(
-            CCX.unitary, (control_qubit0, control_qubit1, target_qubit)
-        )
+        self._init(CCX.matrix, (control_qubit0, control_qubit1, target_qubit))
 
     def __str__(self):
         return "CCX" + str(self.qubits)
 
 class X(Gate):
-    unitary = array(sigma_x)
+    __slots__ = ()
+    matrix = _frozen(sigma_x)
     def __init__(self, qubit):
-        super().__init__(X.unitary, (qubit,))
+        self._init(X.matrix, (qubit,))
 
     def __str__(self):
         return "X(%d)" % self.qubits[0]
 
 class Y(Gate):
-    unitary = array(sigma_y)
+    __slots__ = ()
+    matrix = _frozen(sigma_y)
     def __init__(self, qubit):
-        super().__init__(Y.unitary, (qubit,))
+        self._init(Y.matrix, (qubit,))
 
     def __str__(self):
         return "Y(%d)" % self.qubits[0]
 
 class Z(Gate):
-    unitary = array(sigma_z)
+    __slots__ = ()
+    matrix = _frozen(sigma_z)
     def __init__(self, qubit):
-        super().__init__(Z.unitary, (qubit,))
+        self._init(Z.matrix, (qubit,))
 
     def __str__(self):
         return "Z(%d)" % self.qubits[0]
 
 class T(Gate):
-    unitary = [[0.0]*8 for _ in range(8)]
-    for i in range(6): unitary[i][i] = 1.0
-    unitary[6][7] = 1.0
-    unitary[7][6] = 1.0
-    unitary = array(unitary)
+    __slots__ = ()
+    matrix = [[0.0]*8 for _ in range(8)]
+    for i in range(6): matrix[i][i] = 1.0
+    matrix[6][7] = 1.0
+    matrix[7][6] = 1.0
+    matrix = _frozen(matrix)
     def __init__(self, *qubits):
         """ qubits should be a tuple of length 3 """
-        super().__init__(T.unitary, qubits)
+        if len(qubits) != 3:
+            raise ValueError("T acts on 3 qubits, not %d" % len(qubits))
+        self._init(T.matrix, qubits)
 
     def __str__(self):
         return "T" + str(self.qubits)
 
 class SWAP(Gate):
-    unitary = array([
+    __slots__ = ()
+    matrix = _frozen([
         [1, 0, 0, 0],
         [0, 0, 1, 0],
         [0, 1, 0, 0],
@@ -150,114 +272,166 @@ class SWAP(Gate):
     ])
     def __init__(self, *qubits):
         """ swap two qubits. qubits should be tuple of length 2 """
-        super().__init__(SWAP.unitary, qubits)
+        if len(qubits) != 2:
+            raise ValueError("SWAP acts on 2 qubits, not %d" % len(qubits))
+        self._init(SWAP.matrix, qubits)
 
     def __str__(self):
         return "SWAP" + str(self.qubits)
 
 class CRZ(Gate):
-    unitary = lambda angle: array([
+    __slots__ = ()
+    matrix = lambda angle: [
         [1, 0, 0, 0],
         [0, 1, 0, 0],
         [0, 0, 1, 0],
         [0, 0, 0, exp(1.0j*angle)]
-    ])
+    ]
+    angle = _angle
     def __init__(self, angle, control_qubit, target_qubit):
         qubits = (control_qubit, target_qubit)
-        super().__init__(CRZ.unitary(angle), qubits)
-        self.angle = angle
+        self._init(_interned(CRZ, (angle,)), qubits, (angle,))
 
     def __str__(self):
         return "CRZ" + str((self.angle,) + self.qubits)
 
 class RX(Gate):
-    unitary = lambda angle: expm(-1j * angle / 2 * X.unitary)
+    __slots__ = ()
+    matrix = lambda angle: [
+        [cos(angle/2), -1j*sin(angle/2)],
+        [-1j*sin(angle/2), cos(angle/2)]
+    ]
+    angle = _angle
     def __init__(self, angle, qubit):
         """ rotate the qubit around the x axis by an angle """
-        super().__init__(RX.unitary(angle), (qubit,))
-        self.angle = angle
+        self._init(_interned(RX, (angle,)), (qubit,), (angle,))
 
     def __str__(self):
         return "RX" + str((self.angle,) + self.qubits)
 
 class RY(Gate):
-    unitary = lambda angle: expm(-1j * angle / 2 * Y.unitary)
+    __slots__ = ()
+    matrix = lambda angle: [
+        [cos(angle/2), -sin(angle/2)],
+        [sin(angle/2), cos(angle/2)]
+    ]
+    angle = _angle
     def __init__(self, angle, qubit):
         """ rotate the qubit around the y axis by an angle """
-        super().__init__(RY.unitary(angle), (qubit,))
-        self.angle = angle
+        self._init(_interned(RY, (angle,)), (qubit,), (angle,))
 
     def __str__(self):
         return "RY" + str((self.angle,) + self.qubits)
 
 class RZ(Gate):
-    unitary = lambda angle: expm(-1j * angle / 2 * Z.unitary)
+    __slots__ = ()
+    matrix = lambda angle: [
+        [exp(-1j*angle/2), 0],
+        [0, exp(1j*angle/2)]
+    ]
+    angle = _angle
     def __init__(self, angle, qubit):
         """ rotate the qubit around the z axis by an angle """
-        super().__init__(RZ.unitary(angle), (qubit,))
-        self.angle = angle
+        self._init(_interned(RZ, (angle,)), (qubit,), (angle,))
 
     def __str__(self):
         return "RZ" + str((self.angle,) + self.qubits)
-    
+
 class U3(Gate):
     """ u3(th, phi, lam) = Rz(phi)Ry(th)Rz(lam), see arxiv:1707.03429 """
-    unitary = lambda theta, phi, lam: array([
-        [exp(-1j*(phi+lam)/2)*cos(theta/2), 
+    __slots__ = ()
+    matrix = lambda theta, phi, lam: [
+        [exp(-1j*(phi+lam)/2)*cos(theta/2),
          -exp(-1j*(phi-lam)/2)*sin(theta/2)],
-        [exp(1j*(phi-lam)/2)*sin(theta/2), 
+        [exp(1j*(phi-lam)/2)*sin(theta/2),
          exp(1j*(phi+lam)/2)*cos(theta/2)]
-    ])
+    ]
     def __init__(self, theta, phi, lam, qubit):
-        super().__init__(U3.unitary(theta, phi, lam), (qubit,))
-        self.params = theta, phi, lam
-        
+        params = theta, phi, lam
+        self._init(_interned(U3, params), (qubit,), params)
+
     def __str__(self):
         return "U3" + str(self.params + self.qubits)
-    
+
 class QFT(Gate):
     """ Quantum Fourier Transform """
-    
+    __slots__ = ()
+
     @staticmethod
-    def unitary(num_qubits):
+    def matrix(num_qubits):
         n = 1 << num_qubits
-        u = np.zeros((n, n), dtype=np.complex)
+        u = np.zeros((n, n), dtype=np.complex128)
         omega, c = exp(2j*PI / n), 1 / sqrt(n)
         for i in range(n):
             for j in range(n):
                 u[i][j] = pow(omega, i*j) * c
         return u
-        
+
     def __init__(self, *qubits):
         """ qubits can be of arbitrary length """
-        super().__init__(QFT.unitary(len(qubits)), qubits)
+        self._init(_sized(QFT, len(qubits)), qubits)
 
     def __str__(self):
         return "QFT" + str(self.qubits)
 
 class IQFT(Gate):
     """ Inverse Quantum Fourier Transform """
-    
+    __slots__ = ()
+
     @staticmethod
-    def unitary(num_qubits):
+    def matrix(num_qubits):
         n = 1 << num_qubits
-        u = np.zeros((n, n), dtype=np.complex)
+        u = np.zeros((n, n), dtype=np.complex128)
         omega, c = exp(-2j*PI / n), 1 / sqrt(n)
         for i in range(n):
             for j in range(n):
                 u[i][j] = pow(omega, i*j) * c
         return u
-        
+
     def __init__(self, *qubits):
         """ qubits can be of arbitrary length """
-        super().__init__(IQFT.unitary(len(qubits)), qubits)
+        self._init(_sized(IQFT, len(qubits)), qubits)
 
     def __str__(self):
         return "IQFT" + str(self.qubits)
-    
+
+
+class MEASURE(Gate):
+    """
+    Mid-circuit measurement of the qubits in the computational basis. It is
+    not unitary; registers collapse when they apply it. The unitary is the
+    identity so that the gate still has the usual Gate attributes.
+    """
+    __slots__ = ()
+    matrix = lambda num_qubits: np.eye(1 << num_qubits)
+    def __init__(self, *qubits):
+        """ qubits can be of arbitrary length """
+        self._init(_sized(MEASURE, len(qubits)), qubits)
+
+    def __str__(self):
+        return "MEASURE(%s)" % ", ".join(str(q) for q in self.qubits)
+
+
+_str_gates, _str_gates_lock = OrderedDict(), Lock()
+
 
 def str_to_gate(string):
-    return eval(string.upper())
+    """
+    Gates are immutable, so the same string can share one gate. The 4096 most
+    recently used gates are kept, except for gates on many qubits, whose
+    unitaries are large.
+    """
+    with _str_gates_lock:
+        gate = _str_gates.get(string)
+        if gate is not None:
+            _str_gates.move_to_end(string)
+            return gate
+    gate = eval(string.upper())
+    if len(gate.qubits) <= _MAX_INTERNED_QUBITS:
+        with _str_gates_lock:
+            _str_gates[string] = gate
+            if len(_str_gates) > 4096: _str_gates.popitem(last=False)
+    return gate
 
 
 def apply_gate(string, register):
@@ -0,0 +1,225 @@
+import numpy as np
+from time import perf_counter
+from qSonify.qc.gates import str_to_gate, MEASURE
+from qSonify.qc.batch import BatchRegister, _apply_matrix, _choose
+from qSonify.qc.algorithms import num_qubits_required
+
+
+class Channel:
+
+    def __init__(self, kraus):
+        """
+        Single qubit quantum channel given by its Kraus operators.
+
+        kraus: list of 2x2 matrices K_i such that sum_i K_i^dag K_i = I.
+        """
+        self.kraus = [np.array(k, dtype=np.complex128) for k in kraus]
+        if any(k.shape != (2, 2) for k in self.kraus):
+            raise ValueError("Kraus operators must be 2 x 2")
+        total = sum(k.conj().T @ k for k in self.kraus)
+        if not np.allclose(total, np.eye(2)):
+            raise ValueError("Kraus operators must satisfy sum K^dag K = I")
+
+    def __repr__(self):
+        return "Channel(%d Kraus operators)" % len(self.kraus)
+
+
+def depolarizing(p):
+    """
+    Depolarizing channel, with probability p the qubit is replaced by the
+    maximally mixed state.
+
+    p: float in [0, 1].
+    return: Channel object.
+    """
+    x, y, z = (np.array(s) for s in ([[0, 1], [1, 0]],
+                                     [[0, -1j], [1j, 0]],
+                                     [[1, 0], [0, -1]]))
+    return Channel([np.sqrt(1 - 3*p/4) * np.eye(2)] +
+                   [np.sqrt(p/4) * s for s in (x, y, z)])
+
+
+def amplitude_damping(gamma):
+    """
+    Amplitude damping channel, |1> decays to |0> with probability gamma.
+
+    gamma: float in [0, 1].
+    return: Channel object.
+    """
+    return Channel([[[1, 0], [0, np.sqrt(1 - gamma)]],
+                    [[0, np.sqrt(gamma)], [0, 0]]])
+
+
+def dephasing(p):
+    """
+    Dephasing channel, with probability p the qubit is hit by a Z.
+
+    p: float in [0, 1].
+    return: Channel object.
+    """
+    return Channel([np.sqrt(1 - p) * np.eye(2),
+                    np.sqrt(p) * np.array([[1, 0], [0, -1]])])
+
+
+class NoiseModel:
+
+    def __init__(self):
+        """
+        Attach channels to gates and qubits. Channels are applied after the
+        gate they are attached to, on each qubit that the gate acts on.
+        """
+        self.gate_noise, self.qubit_noise, self.all_noise = {}, {}, []
+
+    def add_gate_noise(self, gate, channel):
+        """
+        Apply the channel after every gate of a type.
+
+        gate: str or Gate class, ie "cx" or qSonify.gates.CX.
+        channel: Channel object.
+        return: the NoiseModel, so that calls can be chained.
+        """
+        name = gate.__name__ if isinstance(gate, type) else gate.upper()
+        self.gate_noise.setdefault(name, []).append(channel)
+        return self
+
+    def add_qubit_noise(self, qubit, channel):
+        """
+        Apply the channel to the qubit after every gate that acts on it.
+
+        qubit: int.
+        channel: Channel object.
+        return: the NoiseModel, so that calls can be chained.
+        """
+        self.qubit_noise.setdefault(qubit, []).append(channel)
+        return self
+
+    def add_all_qubit_noise(self, channel):
+        """
+        Apply the channel to every qubit that every gate acts on.
+
+        channel: Channel object.
+        return: the NoiseModel, so that calls can be chained.
+        """
+        self.all_noise.append(channel)
+        return self
+
+    def channels(self, gate):
+        """
+        Find the channels to apply after a gate.
+
+        gate: Gate object.
+        return: list of tuples (channel, qubit).
+        """
+        if isinstance(gate, MEASURE): return []
+        gate_noise = self.gate_noise.get(type(gate).__name__, [])
+        return [
+            (c, q) for q in gate.qubits
+            for c in gate_noise + self.qubit_noise.get(q, []) + self.all_noise
+        ]
+
+
+def apply_channel(batch, channel, qubit, rng=np.random):
+    """
+    Apply a channel to a qubit of every trajectory in a batch, by picking one
+    Kraus operator for each trajectory with probability ||K_i psi||^2.
+
+    batch: BatchRegister object, each member of the batch is a trajectory.
+    channel: Channel object.
+    qubit: int.
+    rng: object with a random(size) method, ie np.random.
+    return: None.
+    """
+    psis = np.array([_apply_matrix(batch.state, k, (qubit,))
+                     for k in channel.kraus])
+    norms = (np.abs(psis)**2).sum(axis=2).T
+    chosen, rows = _choose(norms, rng), np.arange(len(batch))
+    batch.state = (
+        psis[chosen, rows] / np.sqrt(norms[rows, chosen])[:, None]
+    )
+
+
+def _run_trajectories(algorithm, noise_model, initial_states, seed,
+                      profiler=None):
+    """
+    Simulate a chunk of trajectories. Runs in a worker process. If profiler
+    is not None, then each gate is recorded, including its noise.
+    """
+    rng = np.random if seed is None else np.random.RandomState(seed)
+    batch = BatchRegister(initial_states)
+    for gate in algorithm:
+        if profiler is not None: start = perf_counter()
+        if isinstance(gate, MEASURE): batch.measure(gate.qubits, rng)
+        else: batch.apply_gate(gate)
+        for channel, qubit in noise_model.channels(gate):
+            apply_channel(batch, channel, qubit, rng)
+        if profiler is not None:
+            profiler.record_gate(
+                gate, start, perf_counter() - start,
+                np.count_nonzero(batch.state), batch.state.nbytes
+            )
+    return batch.state
+
+
+def simulate_trajectories(algorithm, noise_model, num_trajectories=100,
+                          num_qubits=None, initial_state=None,
+                          processes=None, seed=None, profiler=None):
+    """
+    Simulate a noisy algorithm with Monte-Carlo wavefunction trajectories.
+    All trajectories are evolved together in a BatchRegister, so each gate
+    and each Kraus operator is applied with one vectorized operation.
+
+    algorithm: list of Gate objects and/or string gates.
+    noise_model: NoiseModel object.
+    num_trajectories: int, number of trajectories.
+    num_qubits: int, number of qubits to run the algorithm on. If num_qubits
+                     is None, then it will run on the minimum required.
+    initial_state: str, basis state to start in. If initial_state is None,
+                        then start in |0...0>.
+    processes: int, number of processes to split the trajectories between.
+                    If processes is None, then run in this process.
+    seed: int, seed for the random numbers, or None.
+    profiler: qSonify.Profiler object. If profiler is not None, then the
+              time, number of nonzero amplitudes and bytes held are
+              recorded for each gate. Gates that run in other processes
+              (when processes > 1) are not recorded.
+
+    return: BatchRegister object, member i is the final state of trajectory i.
+    """
+    algorithm = [str_to_gate(g) if isinstance(g, str) else g
+                 for g in algorithm]
+    if num_qubits is None: num_qubits = num_qubits_required(algorithm)
+    if initial_state is None: initial_state = "0" * num_qubits
+    if processes is None or processes <= 1:
+        return BatchRegister(_run_trajectories(
+            algorithm, noise_model, [initial_state] * num_trajectories, seed,
+            profiler
+        ))
+
+    # imported here since it is slow to import and often not needed.
+    from concurrent.futures import ProcessPoolExecutor
+    seeds = np.random.SeedSequence(seed).generate_state(processes)
+    chunks = [len(c) for c in np.array_split(range(num_trajectories),
+                                             processes) if len(c)]
+    with ProcessPoolExecutor(processes) as executor:
+        states = executor.map(
+            _run_trajectories,
+            [algorithm] * len(chunks), [noise_model] * len(chunks),
+            [[initial_state] * c for c in chunks], seeds[:len(chunks)]
+        )
+        return BatchRegister(np.concatenate(list(states)))
+
+
+def noisy_prob_dist(trajectories):
+    """
+    Estimate the probability distribution of the noisy state, ie the
+    diagonal of its density matrix, by averaging over trajectories.
+
+    trajectories: BatchRegister object, see simulate_trajectories.
+    return: dict, states mapped to probabilities.
+    """
+    probs = trajectories.probabilities().mean(axis=0)
+    n = trajectories.num_qubits
+    return {
+        ("{0:0%db}" % n).format(x): probs[x]
+        for x in np.flatnonzero(probs > 1e-16)
+    }
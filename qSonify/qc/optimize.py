@@ -0,0 +1,118 @@
+import numpy as np
+from heapq import merge
+from qSonify.qc.gates import str_to_gate, RX, RY, RZ, CRZ, MEASURE
+
+
+# don't attempt numerical commutation checks on more qubits than this.
+_MAX_COMMUTE_QUBITS = 5
+
+
+def _unitary_on(gate, qubits):
+    """
+    Find the unitary of the gate acting on the ordered tuple of qubits, which
+    must contain all of gate.qubits.
+
+    gate: Gate object.
+    qubits: tuple of ints.
+
+    return: numpy array, 2^len(qubits) x 2^len(qubits).
+    """
+    n = len(qubits)
+    rest = [q for q in qubits if q not in gate.qubits]
+    order = list(gate.qubits) + rest
+    u = np.kron(gate.unitary, np.eye(1 << len(rest)))
+    perm = [order.index(q) for q in qubits]
+    u = u.reshape((2,) * 2 * n).transpose(perm + [n + p for p in perm])
+    return u.reshape(1 << n, 1 << n)
+
+
+def _is_identity(unitary):
+    """ Whether the unitary is the identity up to a global phase. """
+    phase = unitary[0][0]
+    return (
+        abs(abs(phase) - 1.0) < 1e-10 and
+        np.allclose(unitary, phase * np.eye(len(unitary)))
+    )
+
+
+def _commute(g0, g1):
+    """ Whether the two gates commute. Measurements are barriers. """
+    qubits = tuple(sorted(set(g0.qubits) | set(g1.qubits)))
+    if len(qubits) == len(g0.qubits) + len(g1.qubits): return True
+    if isinstance(g0, MEASURE) or isinstance(g1, MEASURE): return False
+    if len(qubits) > _MAX_COMMUTE_QUBITS: return False
+    u0, u1 = _unitary_on(g0, qubits), _unitary_on(g1, qubits)
+    return np.allclose(u0 @ u1, u1 @ u0)
+
+
+def _merge(g0, g1):
+    """
+    Try to combine g0 followed by g1 into a single gate. The two gates must
+    act on the same set of qubits.
+
+    return: Gate object if they merge, None if they cancel, or NotImplemented
+            if they can't be combined.
+    """
+    if type(g0) is type(g1) and type(g0) in (RX, RY, RZ):
+        return type(g0)(g0.angle + g1.angle, g0.qubits[0])
+    elif type(g0) is type(g1) is CRZ:
+        # CRZ is symmetric in its two qubits.
+        return CRZ(g0.angle + g1.angle, *g0.qubits)
+    elif _is_identity(_unitary_on(g1, g0.qubits) @ g0.unitary):
+        return None
+    return NotImplemented
+
+
+def optimize(algorithm):
+    """
+    Peephole optimize an algorithm. The algorithm is parsed into a dependency
+    DAG where each gate depends on the previous gate on each of its qubits.
+    Walking back along the DAG, past gates that commute with it, each gate
+    is cancelled against its inverse or merged with a rotation about the same
+    axis. Gates equivalent to the identity are dropped. The optimized
+    algorithm prepares the same state up to a global phase.
+
+    For example,
+        optimize(["h(0)", "x(1)", "rz(.5, 0)", "x(1)", "rz(-.5, 0)", "h(0)"])
+    would return ([], 6).
+
+    algorithm: list of Gate objects and/or string gates.
+
+    return: tuple (list, int), the optimized algorithm and the number of
+            gates that were removed. Gates that were not touched are left as
+            they were given (ie strings stay strings).
+    """
+    # nodes[i] is the gate at node i, or None if it was removed. items[i] is
+    # what to put in the optimized algorithm for that node.
+    nodes, items, on_qubit = [], [], {}
+
+    for item in algorithm:
+        gate = str_to_gate(item) if isinstance(item, str) else item
+        measure = isinstance(gate, MEASURE)
+        if not measure and _is_identity(gate.unitary): continue
+
+        qubits = set(gate.qubits)
+        previous = merge(
+            *(reversed(on_qubit.get(q, ())) for q in qubits), reverse=True
+        )
+        last, absorbed = None, False
+        for i in (() if measure else previous):
+            if i == last or nodes[i] is None: continue
+            last, node = i, nodes[i]
+            if set(node.qubits) == qubits and not isinstance(node, MEASURE):
+                merged = _merge(node, gate)
+                if merged is not NotImplemented:
+                    if merged is None or _is_identity(merged.unitary):
+                        nodes[i] = items[i] = None
+                    else: nodes[i] = items[i] = merged
+                    absorbed = True
+                    break
+            if not _commute(node, gate): break
+
+        if not absorbed:
+            for q in qubits: on_qubit.setdefault(q, []).append(len(nodes))
+            nodes.append(gate)
+            items.append(item)
+
+    optimized = [x for x in items if x is not None]
+    return optimized, len(algorithm) - len(optimized)
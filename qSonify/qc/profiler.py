@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+from time import perf_counter
+from contextlib import contextmanager
+
+
+class _NullPhase:
+    """ Context manager that does nothing. """
+    def __enter__(self): return None
+    def __exit__(self, *args): return False
+
+
+_null_phase = _NullPhase()
+
+
+def phase(profiler, name):
+    """
+    Context manager that times a phase if profiler is not None, and does
+    nothing otherwise.
+
+    profiler: Profiler object or None.
+    name: str, name of the phase, ie "simulate".
+    """
+    return _null_phase if profiler is None else profiler.phase(name)
+
+
+def register_nbytes(register):
+    """ Approximate number of bytes held by a Register object. """
+    return sys.getsizeof(register) + sum(
+        sys.getsizeof(k) + sys.getsizeof(v) for k, v in register.items()
+    )
+
+
+class Profiler:
+
+    def __init__(self, callback=None):
+        """
+        Collect per-gate and per-phase timings. Pass a Profiler to
+        Register.apply_algorithm, BatchRegister.apply_algorithm,
+        simulate_branches, alg_to_song or Song.writeFile to record them.
+        Nothing is recorded, and there is no overhead, when no profiler is
+        passed.
+
+        callback: function, called with each event (a dict) as it is
+                  recorded.
+        """
+        self.callback, self.events, self.origin = callback, [], perf_counter()
+
+    def _record(self, event):
+        self.events.append(event)
+        if self.callback is not None: self.callback(event)
+
+    def record_gate(self, gate, start, duration, nonzero, nbytes, pruned=0):
+        """
+        Record the application of a gate.
+
+        gate: Gate object or str gate.
+        start: float, time.perf_counter() when the gate started.
+        duration: float, seconds it took.
+        nonzero: int, number of nonzero amplitudes after the gate.
+        nbytes: int, bytes held by the state after the gate.
+        pruned: int, number of amplitudes that were zeroed beyond machine
+                     precision and removed.
+        """
+        self._record(dict(
+            type="gate", name=str(gate), start=start - self.origin,
+            duration=duration, nonzero=nonzero, bytes=nbytes, pruned=pruned
+        ))
+
+    def record_phase(self, name, start, duration):
+        """
+        Record a phase, ie "simulate", "sample", "map" or "write".
+
+        name: str.
+        start: float, time.perf_counter() when the phase started.
+        duration: float, seconds it took.
+        """
+        self._record(dict(
+            type="phase", name=name, start=start - self.origin,
+            duration=duration
+        ))
+
+    @contextmanager
+    def phase(self, name):
+        """ Context manager that records the phase it wraps. """
+        start = perf_counter()
+        try: yield self
+        finally: self.record_phase(name, start, perf_counter() - start)
+
+    def summary(self):
+        """
+        Total up the events.
+
+        return: dict, maps ("gate" or "phase", name) to a dict with the
+                number of events and their total duration in seconds.
+        """
+        totals = {}
+        for e in self.events:
+            t = totals.setdefault((e["type"], e["name"]),
+                                  dict(count=0, duration=0.0))
+            t["count"] += 1
+            t["duration"] += e["duration"]
+        return totals
+
+    def to_chrome_trace(self):
+        """
+        Convert the events to the Chrome trace event format, which can be
+        viewed in chrome://tracing or Perfetto. Gate events also produce a
+        counter track of the number of nonzero amplitudes.
+
+        return: dict.
+        """
+        pid, trace = os.getpid(), []
+        for e in self.events:
+            ts = 1e6 * e["start"]
+            args = {k: e[k] for k in ("nonzero", "bytes", "pruned") if k in e}
+            trace.append(dict(
+                name=e["name"], cat=e["type"], ph="X", ts=ts,
+                dur=1e6 * e["duration"], pid=pid, tid=0, args=args
+            ))
+            if e["type"] == "gate":
+                trace.append(dict(
+                    name="state", ph="C", ts=ts, pid=pid, tid=0,
+                    args=dict(nonzero=e["nonzero"], bytes=e["bytes"])
+                ))
+        return dict(traceEvents=trace, displayTimeUnit="ms")
+
+    def write_chrome_trace(self, path):
+        """
+        Write the Chrome trace to a JSON file.
+
+        path: str, ie "trace.json".
+        """
+        with open(path, "w") as f: json.dump(self.to_chrome_trace(), f)
@@ -1,5 +1,7 @@
 import numpy as np
-from qSonify.qc.gates import str_to_gate
+from time import perf_counter
+from qSonify.qc.gates import str_to_gate, MEASURE
+from qSonify.qc.profiler import register_nbytes
 
 
 def all_states(num_qubits):
@@ -13,16 +15,17 @@ def all_states(num_qubits):
             yield from (s+"0", s+"1")
             
 
-def random_state(prob_dist):
+def random_state(prob_dist, rng=np.random):
     """
     Pick a state from the probability distribution.
     
     prob_dist: dict, maps states to probabilities.
                     ex: {"000": 0.5, "110": .25, "111": .25}
+    rng: object with a random() method, ie np.random.
     
     return: str, state.
     """
-    r = np.random.random()
+    r = rng.random()
     total = 0.0
     for state in prob_dist:
         total += prob_dist[state]
@@ -56,6 +59,8 @@ class Register(dict):
         super().__init__()
         if num_qubits is None: self.num_qubits, self.grow = 1, True
         else: self.num_qubits, self.grow = num_qubits, False
+        # number of amplitudes removed for being zero beyond machine precision
+        self.pruned = 0
         self["0"*self.num_qubits] = 1.0+0.0j
 
     def __getitem__(self, item):
@@ -129,6 +134,10 @@ class Register(dict):
                 self.clear()
                 for state, amp in old.items(): self[state + "0"*n] = amp
                 self.num_qubits = m + 1
+
+        if isinstance(gate, MEASURE):
+            self.measure(gate.qubits)
+            return
         
         old = self.copy() 
         temp_states = [x for x in all_states(gate.num_qubits)]
@@ -139,7 +148,9 @@ class Register(dict):
             self[state] -= (1.0 - gate[r][r]) * old[state]
             
             # zero beyond machine precision
-            if self.probability(state) < 1e-16: self.pop(state)
+            if self.probability(state) < 1e-16: 
+                self.pop(state)
+                self.pruned += 1
 
             j = 0
             for k in temp_states:
@@ -150,7 +161,9 @@ class Register(dict):
                     c = gate[j][r] * old[state]
                     if s in self:
                         self[s] += c
-                        if self.probability(s) < 1e-16: self.pop(s)
+                        if self.probability(s) < 1e-16: 
+                            self.pop(s)
+                            self.pruned += 1
                     elif c != 0.0: self[s] = c
                 j += 1
 
@@ -164,17 +177,31 @@ class Register(dict):
         """
         prob_dist = self.get_prob_dist(qubits)
         state = random_state(prob_dist)
+        self.collapse(state, qubits, prob_dist[state])
+        return state
+
+    def collapse(self, state, qubits=None, probability=None):
+        """
+        Collapse the register in place onto the outcome of a measurement.
+        
+        state: str, outcome of measuring the qubits.
+        qubits: tuple, qubits that were measured. If qubits is None, then all
+                       of them were.
+        probability: float, probability of the outcome. If probability is
+                            None, then it will be computed.
+        return: None.
+        """
         if qubits is None:
             self.clear()
             self[state] = 1.0+0.0j
-        else:
-            old_register = self.copy()
-            self.clear()
-            p = prob_dist[state]**0.5
-            for s, amp in old_register.items():
-                if get_sub_state(s, qubits) == state: self[s] = amp / p
-            
-        return state
+            return
+        
+        if probability is None: 
+            probability = self.get_prob_dist(qubits).get(state, 0.0)
+        p = probability**0.5
+        for s in list(self):
+            if get_sub_state(s, qubits) == state: self[s] /= p
+            else: self.pop(s)
     
     def sample(self, num_samples=1, qubits=None):
         """
@@ -201,7 +228,9 @@ class Register(dict):
     def duplicate(self):
         """ return a copy of the register """
         reg = Register(self.num_qubits)
+        reg.clear()
         for (key, item) in self.items(): reg[key] = item
+        reg.pruned = self.pruned
         return reg
 
     def ket(self):
@@ -230,7 +259,7 @@ class Register(dict):
         ket = self.ket()
         return ket @ np.conjugate(np.transpose(ket))
         
-    def apply_algorithm(self, algorithm):
+    def apply_algorithm(self, algorithm, profiler=None):
         """
         Apply the algorithm to the register
         
@@ -239,9 +268,22 @@ class Register(dict):
                        "x(0)", 
                        qSonify.Gate(unitary=[[...], ...], qubits=(1, 2))
                       ]
+        profiler: qSonify.Profiler object. If profiler is not None, then the
+                  time, number of nonzero amplitudes, bytes held and pruned
+                  amplitudes are recorded for each gate.
         return: None
         """
-        for gate in algorithm: self.apply_gate(gate)
+        if profiler is None:
+            for gate in algorithm: self.apply_gate(gate)
+            return
+        
+        for gate in algorithm:
+            pruned, start = self.pruned, perf_counter()
+            self.apply_gate(gate)
+            profiler.record_gate(
+                gate, start, perf_counter() - start, len(self),
+                register_nbytes(self), self.pruned - pruned
+            )
         
     def reset(self):
         """ Reset the register to the state |00...> """
@@ -0,0 +1,205 @@
+import numpy as np
+from qSonify.qc.gates import str_to_gate, MEASURE
+from qSonify.qc.batch import _apply_matrix, _to_state
+from qSonify.qc.algorithms import num_qubits_required
+
+
+class CircuitSession:
+
+    def __init__(self, algorithm, num_qubits=None, checkpoint_interval=16):
+        """
+        An algorithm that is edited and re-simulated interactively. Every
+        initial state that the song visits is simulated together, as the rows
+        of a BatchRegister-style dense state, and the state of all of them is
+        kept after every checkpoint_interval gates. After an edit, simulation
+        resumes from the last checkpoint before the edit, so the cost of an
+        edit is proportional to the number of gates after it. Simulation is
+        lazy; it happens when a distribution or sample is asked for.
+
+        Mid-circuit measurements are not supported, since the dense state of
+        each row is a single pure state.
+
+        algorithm: list of Gate objects and/or string gates.
+        num_qubits: int, number of qubits to run the algorithm on. If
+                         num_qubits is None, then it will run on the minimum
+                         required. Edits cannot use more qubits than this.
+        checkpoint_interval: int, number of gates between checkpoints.
+        """
+        self._gates = []
+        self.num_qubits = (num_qubits_required(algorithm)
+                           if num_qubits is None else num_qubits)
+        self.checkpoint_interval = checkpoint_interval
+        for g in algorithm: self._gates.append(self._check(g))
+
+        # self.starts[i] is the initial state of row i. self._checkpoints[k]
+        # is the state of every row after the first k gates.
+        self.starts, self._rows = [], {}
+        self._checkpoints = {0: np.zeros((0, 1 << self.num_qubits),
+                                         dtype=np.complex128)}
+        self._final, self._transitions = None, {}
+        # number of gate applications to a batch, to see the cost of edits.
+        self.gates_applied = 0
+
+    def _check(self, gate):
+        if isinstance(gate, str): gate = str_to_gate(gate)
+        if isinstance(gate, MEASURE):
+            raise ValueError("CircuitSession does not support measurements")
+        if max(gate.qubits) >= self.num_qubits:
+            raise ValueError("Gate operates on non initialized qubit")
+        return gate
+
+    @property
+    def algorithm(self):
+        """ list of Gate objects, a copy of the current algorithm. """
+        return list(self._gates)
+
+    def __len__(self):
+        return len(self._gates)
+
+    def __getitem__(self, index):
+        return self._gates[index]
+
+    #### edits ####
+
+    def _invalidate(self, index):
+        """
+        Drop everything that depends on the gates from index on. The
+        checkpoint after the first k gates only depends on gates before k.
+        """
+        for k in [k for k in self._checkpoints if k > index]:
+            del self._checkpoints[k]
+        self._final, self._transitions = None, {}
+
+    def insert(self, index, gate):
+        """
+        Insert a gate before index.
+
+        index: int.
+        gate: Gate object or str gate.
+        """
+        gate = self._check(gate)
+        index = range(len(self._gates) + 1)[index]
+        self._gates.insert(index, gate)
+        self._invalidate(index)
+
+    def append(self, gate):
+        """ gate: Gate object or str gate, added at the end. """
+        self.insert(len(self._gates), gate)
+
+    def delete(self, index):
+        """ index: int, which gate to remove. """
+        index = range(len(self._gates))[index]
+        del self._gates[index]
+        self._invalidate(index)
+
+    def replace(self, index, gate):
+        """
+        index: int, which gate to replace.
+        gate: Gate object or str gate, gate to replace it with.
+        """
+        gate = self._check(gate)
+        index = range(len(self._gates))[index]
+        self._gates[index] = gate
+        self._invalidate(index)
+
+    def set_angle(self, index, angle):
+        """
+        Change the angle of a rotation gate, ie RX, RY, RZ or CRZ.
+
+        index: int, which gate to change.
+        angle: float, new angle.
+        """
+        gate = self._gates[index]
+        if not hasattr(gate, "angle"):
+            raise ValueError("%s does not have an angle" % gate)
+        self.replace(index, type(gate)(angle, *gate.qubits))
+
+    #### simulation ####
+
+    def _advance(self, state, start, end):
+        """ Apply the gates start through end - 1 to a batch state. """
+        for gate in self._gates[start:end]:
+            state = _apply_matrix(state, gate.unitary, gate.qubits)
+            self.gates_applied += 1
+        return state
+
+    def _add_starts(self, starts):
+        """ Simulate new initial states up to every existing checkpoint. """
+        state = np.zeros((len(starts), 1 << self.num_qubits),
+                         dtype=np.complex128)
+        for i, s in enumerate(starts):
+            state[i, int(s, base=2)] = 1.0
+            self._rows[s] = len(self.starts)
+            self.starts.append(s)
+
+        previous = 0
+        for k in sorted(self._checkpoints):
+            state = self._advance(state, previous, k)
+            self._checkpoints[k] = np.vstack((self._checkpoints[k], state))
+            previous = k
+        if self._final is not None:
+            state = self._advance(state, previous, len(self._gates))
+            self._final = np.vstack((self._final, state))
+
+    def _simulate(self):
+        """ Simulate from the last checkpoint to the end of the algorithm. """
+        k = max(self._checkpoints)
+        state = self._checkpoints[k]
+        for i in range(k, len(self._gates)):
+            state = self._advance(state, i, i + 1)
+            if (i + 1) % self.checkpoint_interval == 0:
+                self._checkpoints[i + 1] = state
+        self._final = state
+
+    def final_state(self, start):
+        """
+        start: str, initial basis state, ie "010".
+        return: numpy array of the amplitudes of the algorithm run on
+                |start>.
+        """
+        if start not in self._rows: self._add_starts([start])
+        if self._final is None: self._simulate()
+        return self._final[self._rows[start]]
+
+    def get_prob_dist(self, start, decimal=False):
+        """
+        Get the probability distribution of the algorithm run on |start>.
+
+        start: str, initial basis state, ie "010".
+        decimal: bool, whether to represents states in qubits (binary) form or
+                       decimal form.
+        return: dict, states mapped to probabilities.
+        """
+        probs = np.abs(self.final_state(start))**2
+        return {(int(x) if decimal else _to_state(x, self.num_qubits)):
+                probs[x] for x in np.flatnonzero(probs > 1e-16)}
+
+    def _transition(self, start):
+        """
+        return: tuple of numpy arrays, the basis states (in decimal) that
+                |start> can go to and their cumulative probabilities.
+        """
+        if start not in self._transitions:
+            probs = np.abs(self.final_state(start))**2
+            states = np.flatnonzero(probs > 1e-16)
+            self._transitions[start] = states, np.cumsum(probs[states])
+        return self._transitions[start]
+
+    def markov_samples(self, seed=None):
+        """
+        Generator that Markovian samples the algorithm forever, like
+        qSonify.markov_samples. It always samples the current algorithm, so
+        edits made while sampling are heard from the next sample on.
+
+        seed: int, seed for the random numbers. If seed is None, then numpy's
+                   global random state is used.
+        yields: strs, "001", "110", ...
+        """
+        rng = np.random if seed is None else np.random.RandomState(seed)
+        start = "0" * self.num_qubits
+        while True:
+            states, cumulative = self._transition(start)
+            i = int(np.searchsorted(cumulative, rng.random() * cumulative[-1]))
+            start = _to_state(states[min(i, len(states) - 1)],
+                              self.num_qubits)
+            yield start
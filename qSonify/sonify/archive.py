@@ -0,0 +1,165 @@
+"""
+Write many songs into one zip archive instead of one midi file each, and read
+single songs back out of it. Songs are serialized by the caller and written
+by a background thread through a large buffer, so that making the next song
+overlaps writing the last one.
+"""
+
+import queue
+import zipfile
+import threading
+
+_BUFFER_SIZE = 1 << 20
+
+
+def _arcname(name):
+    return name if name.endswith(".mid") else name + ".mid"
+
+
+class ArchiveWriter:
+
+    def __init__(self, path, compression=zipfile.ZIP_STORED, max_pending=64):
+        """
+        Write songs to a zip archive, each as "<song name>.mid". Use it as a
+        context manager, or call close when done:
+            with ArchiveWriter("songs.zip") as archive:
+                for alg in algs: archive.add(alg_to_song(alg, name=...))
+
+        path: str, path of the archive, or a binary file object.
+        compression: int, zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED. Midi
+                          files are small, so storing them is the fastest.
+        max_pending: int, maximum number of songs waiting to be written
+                          before add blocks.
+        """
+        self._file = (open(path, "wb", buffering=_BUFFER_SIZE)
+                      if isinstance(path, str) else None)
+        self._zip = zipfile.ZipFile(self._file or path, "w", compression)
+        self._queue = queue.Queue(max_pending)
+        self._names, self._error = set(), None
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def _write(self):
+        """ Runs in the background thread. """
+        while True:
+            item = self._queue.get()
+            if item is None: return
+            if self._error is not None: continue
+            try: self._zip.writestr(*item)
+            except Exception as e: self._error = e
+
+    def _check(self):
+        if self._error is not None: raise self._error
+
+    def add(self, song, name=None):
+        """
+        Add a song to the archive.
+
+        song: Song object, or bytes of a midi file (ie from Song.toBytes or
+              SongCache.alg_to_song).
+        name: str, name to store it under. If name is None, then the name of
+                   the song is used.
+        return: str, name of the file in the archive.
+        """
+        self._check()
+        if self._queue is None: raise ValueError("archive is closed")
+        if name is None:
+            if isinstance(song, bytes):
+                raise ValueError("a name is needed to add midi bytes")
+            name = song.name
+        name = _arcname(name)
+        if name in self._names:
+            raise ValueError("archive already has a song named %r" % name)
+        self._names.add(name)
+        data = song if isinstance(song, bytes) else song.toBytes()
+        self._queue.put((name, data))
+        return name
+
+    def close(self):
+        """ Finish writing the archive. """
+        if self._queue is None: return
+        self._queue.put(None)
+        self._thread.join()
+        self._queue = None
+        self._zip.close()
+        if self._file is not None: self._file.close()
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write_archive(songs, path, **kwargs):
+    """
+    Write songs to a zip archive. See ArchiveWriter for the keyword
+    arguments.
+
+    songs: iterable of Song objects.
+    path: str, path of the archive.
+    return: list of strs, names of the files in the archive.
+    """
+    with ArchiveWriter(path, **kwargs) as archive:
+        return [archive.add(song) for song in songs]
+
+
+class ArchiveReader:
+
+    def __init__(self, path):
+        """
+        Read songs from an archive made by ArchiveWriter. Only the index of
+        the archive is read when it is opened, and each song is read on its
+        own when it is asked for.
+
+        path: str, path of the archive, or a binary file object.
+        """
+        self._zip = zipfile.ZipFile(path)
+
+    def names(self):
+        """ return: list of strs, names of the songs, without ".mid". """
+        return [n[:-len(".mid")] for n in self._zip.namelist()
+                if n.endswith(".mid")]
+
+    def read(self, name):
+        """
+        Read one song.
+
+        name: str, name of the song, with or without ".mid".
+        return: bytes, the midi file.
+        """
+        try: return self._zip.read(_arcname(name))
+        except KeyError: raise KeyError(name) from None
+
+    def extract(self, name, path=""):
+        """
+        Write one song to a midi file.
+
+        name: str, name of the song.
+        path: str, path to write the file to. Must end with a "/"!
+        return: str, path of the file that was written.
+        """
+        filename = path + _arcname(name)
+        with open(filename, "wb") as f: f.write(self.read(name))
+        return filename
+
+    def __contains__(self, name):
+        try: self._zip.getinfo(_arcname(name))
+        except KeyError: return False
+        return True
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def __len__(self):
+        return len(self.names())
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,137 @@
+"""
+Render Song objects straight to PCM audio, without a midi player. Notes are
+synthesized with a wavetable built from a few harmonics, and every note with
+the same length is rendered with one vectorized operation.
+"""
+
+import wave
+import numpy as np
+
+_TABLE_SIZE = 4096
+
+
+def _wavetable(harmonics):
+    """
+    One period of an additive waveform.
+
+    harmonics: tuple of floats, amplitude of the 1st, 2nd, ... harmonic.
+    return: numpy array of length _TABLE_SIZE, normalized to peak 1.
+    """
+    phase = 2 * np.pi * np.arange(_TABLE_SIZE) / _TABLE_SIZE
+    table = sum(a * np.sin((h + 1) * phase) for h, a in enumerate(harmonics))
+    return table / np.abs(table).max()
+
+
+def _notes(song, sample_rate):
+    """
+    Convert the note events of a song to samples.
+
+    return: tuple of numpy arrays (start, length, frequency, amplitude), the
+            start and length are in samples and do not include the release.
+    """
+    if not song.events: return tuple(np.zeros(0) for _ in range(4))
+    _, pitch, beat, duration, volume = (
+        np.array(x) for x in zip(*song.events)
+    )
+    seconds = 60.0 / song.tempo
+    start = np.round(beat * seconds * sample_rate).astype(int)
+    length = np.round(duration * seconds * sample_rate).astype(int)
+    frequency = 440.0 * 2.0**((pitch - 69) / 12.0)
+    return start, length, frequency, volume / 127.0
+
+
+def iter_chunks(song, sample_rate=44100, chunk_seconds=5.0,
+                harmonics=(1.0, .5, .25, .125), attack=.01, release=.1,
+                gain=.25):
+    """
+    Generator that renders the song in chunks of audio. Each note has a
+    linear attack and release envelope, notes are mixed, and the mix is soft
+    clipped with tanh so that it stays in [-1, 1].
+
+    song: Song object.
+    sample_rate: int, samples per second.
+    chunk_seconds: float, length of each chunk.
+    harmonics: tuple of floats, amplitude of each harmonic of the waveform.
+    attack: float, seconds for a note to reach full volume.
+    release: float, seconds for a note to fade out after it ends.
+    gain: float, amplitude of a note at full midi volume.
+
+    yields: numpy arrays of float32 samples.
+    """
+    table = _wavetable(harmonics)
+    start, length, frequency, amplitude = _notes(song, sample_rate)
+    attack = max(int(attack * sample_rate), 1)
+    release = max(int(release * sample_rate), 1)
+    end = start + length + release
+    total = int(end.max()) if len(end) else 0
+    chunk = max(int(chunk_seconds * sample_rate), 1)
+    # envelopes[l] is the envelope of a note of length l.
+    envelopes = {}
+
+    for c0 in range(0, total, chunk):
+        c1 = min(c0 + chunk, total)
+        out = np.zeros(c1 - c0)
+        active = (start < c1) & (end > c0)
+        for l in np.unique(length[active]):
+            notes = np.flatnonzero(active & (length == l))
+            if l not in envelopes:
+                u = np.arange(l + release)
+                envelopes[l] = np.minimum(
+                    np.minimum(u / attack, 1.0),
+                    np.clip((l + release - u) / release, 0.0, 1.0)
+                )
+            # only the samples of each note that are inside the chunk are
+            # made, from lo up to hi samples into the note. Notes that are
+            # wholly inside the chunk share the same samples.
+            lo = np.clip(c0 - start[notes], 0, l + release)
+            hi = np.clip(c1 - start[notes], 0, l + release)
+            whole = (lo == 0) & (hi == l + release)
+            for part in (whole, ~whole):
+                if not part.any(): continue
+                if part is whole: t = np.arange(l + release)[None, :]
+                else: t = lo[part][:, None] + np.arange((hi - lo)[part].max())
+                # every note of the part at once, shape (notes, samples).
+                n = notes[part]
+                index = (frequency[n] * _TABLE_SIZE / sample_rate)[:, None] * t
+                waves = table[index.astype(int) % _TABLE_SIZE]
+                waves *= envelopes[l][np.minimum(t, l + release - 1)]
+                waves *= (gain * amplitude[n])[:, None]
+
+                position = start[n][:, None] + t - c0
+                if part is not whole:
+                    inside = t < hi[part][:, None]
+                    position, waves = position[inside], waves[inside]
+                out += np.bincount(position.ravel(), weights=waves.ravel(),
+                                   minlength=c1 - c0)
+        yield np.tanh(out).astype(np.float32)
+
+
+def render(song, sample_rate=44100, **kwargs):
+    """
+    Render the whole song to audio. See iter_chunks for the keyword
+    arguments.
+
+    song: Song object.
+    sample_rate: int, samples per second.
+    return: numpy array of float32 samples in [-1, 1].
+    """
+    chunks = list(iter_chunks(song, sample_rate, **kwargs))
+    return np.concatenate(chunks) if chunks else np.zeros(0, np.float32)
+
+
+def write_wav(song, filename, sample_rate=44100, **kwargs):
+    """
+    Render the song and stream it to a 16 bit mono WAV file one chunk at a
+    time. See iter_chunks for the keyword arguments.
+
+    song: Song object.
+    filename: str, path of the file to write, or a binary file object.
+    sample_rate: int, samples per second.
+    return: None.
+    """
+    with wave.open(filename, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        for chunk in iter_chunks(song, sample_rate, **kwargs):
+            f.writeframes((chunk * 32767).astype("<i2").tobytes())
@@ -1,5 +1,7 @@
 from midiutil.MidiFile import MIDIFile
+from qSonify.sonify import audio
 import os
+import io
 
 def _create_midi_mapping():
     """ Create a dictionary that maps note name to midi note integer """
@@ -42,6 +44,8 @@ class Song(MIDIFile):
         self.path = ""
         track, self.channel = 0, 0
         self.time = [0]*num_tracks # start each track at the beginning
+        # (track, pitch, time, duration, volume) for every note added.
+        self.events = []
         self.addTempo(track, self.time[0], self.tempo)
         
     def addNote(self, notes, duration=4, track=0):
@@ -63,6 +67,9 @@ class Song(MIDIFile):
             else: raise ValueError("Note not valid:", note)
             super().addNote(track, self.channel, pitch, 
                             self.time[track], duration, self.volume)
+            self.events.append(
+                (track, pitch, self.time[track], duration, self.volume)
+            )
         self.time[track] += duration
         self.need_to_write = True
         
@@ -85,20 +92,43 @@ class Song(MIDIFile):
         super().addText(track, self.time[track], str(text))
         self.need_to_write = True
         
-    def writeFile(self, path=""):
+    def writeFile(self, path="", profiler=None):
         """ 
         Write the current midi track to a file 
         path: str, path to write the file to. Must end with a "/"!
+        profiler: qSonify.Profiler object. If profiler is not None, then the
+                  "write" phase is recorded.
         """
         if not self.need_to_write: return
+        if profiler is not None:
+            with profiler.phase("write"): self.writeFile(path)
+            return
         try:
             with open(path+self.filename, "wb") as f: super().writeFile(f)
         except FileNotFoundError:
-            os.mkdir(path)
+            # several processes may be writing to the same new directory.
+            os.makedirs(path, exist_ok=True)
             with open(path+self.filename, "wb") as f: super().writeFile(f)
         self.need_to_write = False
         self.path = path
             
+    def toBytes(self):
+        """ Return the contents of the midi file as bytes. """
+        f = io.BytesIO()
+        super().writeFile(f)
+        return f.getvalue()
+        
+    def writeWav(self, path="", **kwargs):
+        """
+        Render the song to audio and write it to a WAV file, without needing
+        a midi player. See qSonify.sonify.audio.iter_chunks for the keyword
+        arguments.
+        
+        path: str, path to write the file to. Must end with a "/"!
+        """
+        if path: os.makedirs(path, exist_ok=True)
+        audio.write_wav(self, path + "%s.wav" % self.name, **kwargs)
+        
     def play(self, path=""):
         """
         Write the midi file, then call on the system's default midi player. On
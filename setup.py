@@ -24,9 +24,13 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/jiosue/qsonify",
     license=license_text,
-    packages=setuptools.find_packages(exclude=("tests", "docs", "outputs")),
+    packages=setuptools.find_packages(exclude=("tests", "docs", "outputs", "benchmarks")),
     test_suite="tests",
     install_requires=requirements,
+    python_requires=">=3.7",
+    entry_points={
+        "console_scripts": ["qsonify=qSonify._cli:main"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
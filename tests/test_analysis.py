@@ -0,0 +1,21 @@
+import numpy as np
+import qSonify
+
+
+def test_analysis():
+
+    alg = ["h(0)", "cx(0, 1)", "rx(.4, 2)", "crz(.5, 2, 0)", "h(2)"]
+    P = qSonify.transition_matrix(alg)
+    assert P.shape == (8, 8) and np.allclose(P.sum(axis=1), 1)
+
+    pi = qSonify.stationary_distribution(P)
+    assert np.allclose(pi @ P, pi)
+    assert qSonify.mixing_time(P) is not None
+
+    histogram = qSonify.expected_histogram(alg, num_samples=40, by="chord")
+    assert abs(sum(histogram.values()) - 40) < 1e-8
+
+    # x(0) deterministically flips between 000 and 100, so the fermionic map
+    # sounds "c" on every other beat.
+    histogram = qSonify.expected_histogram(["x(0)"], num_samples=10)
+    assert histogram == {60: 5}
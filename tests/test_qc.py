@@ -0,0 +1,216 @@
+import numpy as np
+import qSonify
+from qSonify.qc import algorithms
+
+
+def _same_state(alg0, alg1, num_qubits):
+    r0, r1 = qSonify.Register(num_qubits), qSonify.Register(num_qubits)
+    r0.apply_algorithm(alg0)
+    r1.apply_algorithm(alg1)
+    return abs(abs(np.vdot(r0.ket(), r1.ket())) - 1) < 1e-8
+
+
+def test_optimize():
+
+    p = np.random.random(15)
+    alg = algorithms.U2(p, 0, 1) + algorithms.U2dag(p, 0, 1)
+    assert qSonify.optimize(alg) == ([], len(alg))
+    assert qSonify.optimize(algorithms.QFT(3) + algorithms.IQFT(3))[0] == []
+
+    alg = ["h(0)", "h(1)", "rz(.3, 0)", "cx(0, 1)", "rz(.2, 0)",
+           "swap(0, 1)", "swap(1, 0)", "h(1)", "x(0)", "h(1)"]
+    optimized, removed = qSonify.optimize(alg)
+    assert removed == 5
+    assert _same_state(alg, optimized, 2)
+
+
+def test_batch_register():
+
+    alg = algorithms.QFT(3) + ["rx(.3, 1)", "ccx(0, 2, 1)", "swap(0, 2)"]
+    starts = "000", "011", "110"
+    batch = qSonify.BatchRegister(starts)
+    batch.apply_algorithm(alg)
+    for i, s in enumerate(starts):
+        r = qSonify.Register(3)
+        r.apply_algorithm(algorithms.prepare_basis_state(s) + alg)
+        assert np.allclose(r.ket()[:, 0], batch.state[i])
+    assert len(batch.single_samples()) == 3
+
+    # songs simulate the initial states they reach together, and sample them
+    # the same way that CircuitSession does.
+    from itertools import islice
+    profiler = qSonify.Profiler()
+    samples = qSonify.markov_samples(alg, profiler=profiler, seed=3)
+    session = qSonify.CircuitSession(alg).markov_samples(seed=3)
+    assert list(islice(samples, 100)) == list(islice(session, 100))
+    events = [e for e in profiler.events if e["type"] == "gate"]
+    assert len(events) == 2 * len(alg)
+
+
+def test_mid_circuit_measurement():
+
+    alg = ["h(0)", "measure(0)", "cx(0, 1)", "h(2)", "measure(2)"]
+    branches = qSonify.simulate_branches(alg)
+    assert len(branches) == 4
+    assert abs(sum(b[0] for b in branches) - 1) < 1e-10
+    for _, outcomes, reg in branches:
+        state = outcomes[0] * 2 + outcomes[1]
+        assert reg.get_prob_dist(rounded=8) == {state: 1.0}
+
+    counts = qSonify.sample_shots(alg, 100)
+    assert sum(counts.values()) == 100
+    assert all(o[0] * 2 + o[1] == s for o, s in counts)
+
+    r = qSonify.Register(3)
+    r.apply_algorithm(alg)
+    assert len(r) == 1
+
+
+def test_noise():
+
+    from qSonify.qc import noise
+
+    model = noise.NoiseModel().add_gate_noise("h", noise.dephasing(.25))
+    trajectories = noise.simulate_trajectories(
+        ["h(0)", "h(0)"], model, 4000, seed=0
+    )
+    assert abs(noise.noisy_prob_dist(trajectories)["1"] - .25) < .05
+
+    model.add_all_qubit_noise(noise.amplitude_damping(.1))
+    trajectories = noise.simulate_trajectories(
+        ["h(0)", "cx(0, 1)"], model, 10, processes=2, seed=0
+    )
+    assert len(trajectories) == 10
+    assert np.allclose(trajectories.probabilities().sum(axis=1), 1)
+
+    song = qSonify.alg_to_song(["h(0)", "cx(0, 1)"], num_samples=8,
+                               noise_model=model, num_trajectories=20)
+    assert song.time == [8]
+
+    songs = [qSonify.alg_to_song(["h(0)", "cx(0, 1)"], num_samples=8,
+                                 noise_model=model, num_trajectories=20,
+                                 seed=1, processes=2) for _ in range(2)]
+    assert songs[0].toBytes() == songs[1].toBytes()
+
+
+def test_profiler():
+
+    events = []
+    profiler = qSonify.Profiler(callback=events.append)
+    r = qSonify.Register(2)
+    r.apply_algorithm(["h(0)", "h(1)", "h(0)"], profiler=profiler)
+    assert [e["nonzero"] for e in events] == [2, 4, 2]
+    assert events[-1]["pruned"] == 2
+
+    del events[:]
+    qSonify.simulate_branches(["h(0)", "h(0)", "h(0)", "measure(0)"],
+                              profiler=profiler)
+    assert [e["pruned"] for e in events] == [0, 1, 0, 0]
+    assert r.duplicate().pruned == r.pruned == 2
+
+    song = qSonify.alg_to_song(["h(0)", "cx(0, 1)"], num_samples=5,
+                               profiler=profiler)
+    phases = {name for kind, name in profiler.summary() if kind == "phase"}
+    assert phases == {"simulate", "sample", "map"}
+    assert len(profiler.to_chrome_trace()["traceEvents"]) > len(events) - 1
+
+    model = qSonify.noise.NoiseModel().add_all_qubit_noise(
+        qSonify.noise.dephasing(.1)
+    )
+    profiler = qSonify.Profiler()
+    qSonify.alg_to_song(["h(0)", "cx(0, 1)"], num_samples=5, seed=0,
+                        noise_model=model, num_trajectories=10,
+                        profiler=profiler)
+    gates = {name for kind, name in profiler.summary() if kind == "gate"}
+    assert gates == {"H(0)", "CX(0, 1)"}
+
+
+def test_session():
+
+    import pytest
+
+    def expected(algorithm, start, num_qubits):
+        r = qSonify.Register(num_qubits)
+        r.apply_algorithm(algorithms.prepare_basis_state(start) + algorithm)
+        return r.get_prob_dist()
+
+    def check(session, starts):
+        for s in starts:
+            dist, want = session.get_prob_dist(s), expected(
+                session.algorithm, s, session.num_qubits
+            )
+            assert set(dist) == set(want)
+            assert all(np.isclose(dist[k], want[k]) for k in want)
+
+    alg = algorithms.QFT(4) + ["rx(.3, %d)" % (i % 4) for i in range(60)]
+    session = qSonify.CircuitSession(alg, checkpoint_interval=8)
+    check(session, ["0000", "0110"])
+    assert session.gates_applied == 2 * len(alg)
+
+    # only the gates from the last checkpoint before the edit are redone.
+    applied = session.gates_applied
+    session.set_angle(-3, 1.2)
+    check(session, ["0000", "0110"])
+    assert session.gates_applied - applied == len(alg) - 64
+
+    session.insert(30, "cx(0, 3)")
+    session.delete(5)
+    session.replace(40, "ry(.5, 2)")
+    session.append("h(1)")
+    check(session, ["0000", "0110", "1111"])
+    assert len(session) == len(alg) + 1
+
+    for bad in ("measure(0)", "x(4)"):
+        with pytest.raises(ValueError): session.append(bad)
+    with pytest.raises(ValueError): session.set_angle(0, 1.0)
+
+    song = qSonify.alg_to_song(session, num_samples=20, seed=3)
+    assert len(song.events) and all(len(s) == 4 for s in session.starts)
+    assert song.toBytes() == qSonify.alg_to_song(
+        session, num_samples=20, seed=3
+    ).toBytes()
+
+
+def test_gates():
+
+    import pickle
+    import pytest
+    from qSonify.qc import gates
+
+    g0, g1 = gates.RX(.3, 1), gates.str_to_gate("rx(.3, 1)")
+    assert g0 == g1 and hash(g0) == hash(g1) and g0.unitary is g1.unitary
+    assert g0.angle == .3 and g0.params == (.3,) and g0.num_qubits == 1
+    assert gates.RX(.3, 2).unitary is g0.unitary and gates.RX(.3, 2) != g0
+    assert gates.RY(.3, 1) != g0 and len({g0, g1, gates.RX(.4, 1)}) == 2
+    assert gates.str_to_gate("h(0)") is gates.str_to_gate("h(0)")
+    # large unitaries are not kept.
+    assert gates.QFT(0, 1).unitary is gates.QFT(2, 3).unitary
+    big = tuple(range(gates._MAX_INTERNED_QUBITS + 1))
+    assert gates.QFT(*big).unitary is not gates.QFT(*big).unitary
+    assert gates.str_to_gate("qft%s" % (big,)) is not gates.str_to_gate(
+        "qft%s" % (big,))
+
+    with pytest.raises(AttributeError): g0.qubits = (2,)
+    with pytest.raises(AttributeError): g0.angle = 1.0
+    with pytest.raises(ValueError): g0.unitary[0, 0] = 0
+    assert not hasattr(g0, "__dict__")
+    assert gates.X.unitary is gates.X(0).unitary and gates.RX.unitary(.3)
+    with pytest.raises(AttributeError): gates.X.unitary = None
+
+    class S(qSonify.Gate):
+        unitary = np.array([[1, 0], [0, 1j]])
+        def __init__(self, qubit):
+            super().__init__(S.unitary, (qubit,))
+    assert np.array_equal(S(0).unitary, S.unitary) and S(0).qubits == (0,)
+    with pytest.raises(ValueError, match="SWAP acts on 2 qubits"):
+        gates.SWAP(0, 1, 2)
+
+    custom = qSonify.Gate([[0, 1], [1, 0]], (3,))
+    for g in (g0, gates.U3(.1, .2, .3, 0), gates.QFT(0, 2, 1), gates.H(2),
+              gates.MEASURE(0, 1), custom):
+        copy = pickle.loads(pickle.dumps(g))
+        assert copy == g and str(copy) == str(g)
+        assert np.allclose(copy.unitary, g.unitary)
+    assert custom == gates.X(3) ** 1 and custom != gates.X(3)
+    assert len(pickle.dumps(g0)) < 100
+    assert pickle.loads(pickle.dumps(g0)).unitary is g0.unitary
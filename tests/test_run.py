@@ -12,3 +12,59 @@ def test_run():
 
     s1 = qSonify.alg_to_song(alg1, name="HelloWorld_alg1", **kwargs)
     s2 = qSonify.alg_to_song(alg2, name="HelloWorld_alg2", **kwargs)
+
+
+def test_cli(tmp_path, capsys):
+    from qSonify._cli import main
+
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text(
+        '{"algorithm": ["h(0)", "cx(0, 1)"], "name": "bell", "seed": 0}\n'
+        '\n'
+        '{"algorithm": {"name": "QFT", "args": [0, 2]}, "name": "qft", '
+        '"mapping": {"name": "scale", "kwargs": {"notes": ["c", "e"]}}}\n'
+    )
+    out = str(tmp_path / "songs" / "nested")
+    for workers in (1, 2):
+        assert main([str(jobs), "-o", out, "-j", str(workers), "-q"]) == 0
+        assert {p.name for p in (tmp_path / "songs" / "nested").iterdir()} \
+            == {"bell.mid", "qft.mid"}
+
+    bell = (tmp_path / "songs" / "nested" / "bell.mid").read_bytes()
+    assert bell == qSonify.alg_to_song(["h(0)", "cx(0, 1)"], name="bell",
+                                       seed=0).toBytes()
+
+    jobs.write_text('{"algorithm": ["h(0)"], "tempo": 1, "colour": 2}\n'
+                    'not json\n'
+                    '{"algorithm": ["h(0)"], "mapping": "_private"}\n'
+                    '{"algorithm": {"name": "str_to_gate", "args": ["h(0)"]}}\n'
+                    '{"algorithm": ["h(0)"], "mapping": "default_map"}\n')
+    assert main([str(jobs), "-o", out]) == 1
+    err = capsys.readouterr().err
+    assert "jobs.jsonl:1" in err and "colour" in err
+    assert "jobs.jsonl:2" in err and "jobs.jsonl:3" in err
+    assert "'str_to_gate'" in err and "'default_map'" in err
+
+    # gates are checked in linear time, even when they are rejected.
+    import pytest
+    from time import perf_counter
+    from qSonify._jobs import check_gate
+    start = perf_counter()
+    for gate in ("rz(%sa, 0)" % ("1" * 40), "rz(9**9**9, 0)", "h(1j)",
+                 "rz(%s1, 0)" % ("1+" * 200), "h(__import__)", "h(0; 1)"):
+        with pytest.raises(ValueError): check_gate(gate)
+    assert perf_counter() - start < 1
+    assert check_gate("u3(-pi/2, 1e-3, 2*PI, 1)") and check_gate("cx(0,1)")
+
+
+def test_lazy_exports():
+
+    # names that importing qSonify has always made available.
+    for name in ("Gate", "Register", "Song", "alg_to_song", "algorithms",
+                 "freq_to_note", "gates", "maps", "methods", "qc",
+                 "register", "song", "sonify", "log2", "pow", "_qSonify",
+                 "state_to_decimal", "decimal_to_state", "__version__"):
+        assert getattr(qSonify, name) is not None
+    assert qSonify.register.Register is qSonify.Register
+    assert qSonify.song.Song is qSonify.Song
+    assert "register" in dir(qSonify) and "_qSonify" not in qSonify.__all__
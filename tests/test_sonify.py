@@ -0,0 +1,157 @@
+import wave
+import numpy as np
+import pytest
+import qSonify
+from qSonify.sonify import audio
+
+
+def test_audio(tmp_path):
+
+    song = qSonify.alg_to_song(["h(0)", "cx(0, 1)", "h(2)", "x(3)"],
+                               num_samples=8, tempo=240,
+                               mapping=qSonify.maps.stringquartet())
+    samples = audio.render(song, sample_rate=8000)
+    assert abs(len(samples) - 8000 * (8 * .25 + .1)) <= 1
+    assert abs(samples).max() <= 1
+    # chunks only make the part of each note inside them.
+    small = audio.render(song, sample_rate=8000, chunk_seconds=.013)
+    assert np.allclose(small, samples, atol=1e-6)
+
+    song.writeWav(str(tmp_path) + "/", sample_rate=8000, chunk_seconds=.3)
+    with wave.open(str(tmp_path / "alg.wav")) as f:
+        assert f.getnframes() == len(samples)
+
+
+def test_stream():
+
+    import io
+    import asyncio
+
+    stream = qSonify.SonificationStream(
+        ["h(0)", "cx(0, 1)", "h(2)"], mapping=qSonify.maps.grandpiano(),
+        num_samples=10, tempo=3000
+    )
+    f = io.BytesIO()
+    jitter = asyncio.run(stream.run(qSonify.FileSink(f)))
+    # a note on and a note off for each of the two tracks per sample.
+    assert len(f.getvalue().splitlines()) == jitter["count"] == 40
+    assert jitter["max"] >= jitter["mean"] >= 0
+
+    # errors while simulating reach the consumer instead of hanging it.
+    stream = qSonify.SonificationStream(["x(5)"], num_qubits=2,
+                                        num_samples=5)
+    with pytest.raises(ValueError):
+        asyncio.run(asyncio.wait_for(stream.run(qSonify.FileSink(f)), 5))
+
+
+def test_cache(tmp_path):
+
+    alg = ["h(0)", "cx(0, 1)", "rx(.3, 2)"]
+    cache = qSonify.SongCache(str(tmp_path), max_bytes=3000)
+    midi = cache.alg_to_song(alg, seed=1, store_outcomes=True)
+    assert midi == qSonify.alg_to_song(alg, seed=1).toBytes()
+    assert cache.alg_to_song(["H(0)", "CX(0,1)", "RX(0.3, 2)"], seed=1) == midi
+    assert len(cache.get(cache.key(alg, seed=1))[1]) == 40
+
+    for seed in range(10): cache.alg_to_song(alg, seed=seed)
+    assert 0 < cache.size() <= 3000
+
+    # unseeded songs are random, so they are not cached.
+    empty = qSonify.SongCache(str(tmp_path / "empty"))
+    empty.alg_to_song(alg, seed=None)
+    assert empty.size() == 0
+
+
+def test_archive(tmp_path):
+    from qSonify.sonify.archive import ArchiveReader, ArchiveWriter
+
+    songs = [qSonify.alg_to_song(["h(0)", "cx(0, 1)"], num_samples=5,
+                                 name="song%d" % i, seed=i)
+             for i in range(20)]
+    path = str(tmp_path / "songs.zip")
+    names = qSonify.write_archive(songs, path, max_pending=2)
+    assert names == ["song%d.mid" % i for i in range(20)]
+
+    with ArchiveReader(path) as archive:
+        assert len(archive) == 20 and "song3" in archive
+        assert "song3.mid" in archive and "nope" not in archive
+        assert archive.read("song7") == songs[7].toBytes()
+        extracted = archive.extract("song2", str(tmp_path) + "/")
+        with open(extracted, "rb") as f: assert f.read() == songs[2].toBytes()
+        with pytest.raises(KeyError): archive.read("nope")
+
+    with ArchiveWriter(str(tmp_path / "more.zip")) as archive:
+        archive.add(b"MThd", "raw")
+        with pytest.raises(ValueError): archive.add(songs[0], "raw.mid")
+        with pytest.raises(ValueError): archive.add(b"MThd")
+    assert qSonify.ArchiveReader(str(tmp_path / "more.zip")).names() == ["raw"]
+
+
+def test_server(tmp_path):
+
+    import json
+    import asyncio
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from qSonify._server import SonificationServer
+
+    release = threading.Event()
+
+    class Blocking(ThreadPoolExecutor):
+        """ Holds every job until release is set. """
+        def submit(self, fn, *args):
+            return super().submit(lambda: release.wait(5) and fn(*args))
+
+    async def request(port, method, path, body=b""):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(("%s %s HTTP/1.1\r\nContent-Length: %d\r\n\r\n"
+                      % (method, path, len(body))).encode() + body)
+        head, _, body = (await reader.read()).partition(b"\r\n\r\n")
+        writer.close()
+        return int(head.split()[1]), head.decode(), body
+
+    job = dict(algorithm=["h(0)", "cx(0, 1)"], name="bell", seed=0)
+
+    async def run():
+        server = SonificationServer(port=0, executor=Blocking(2),
+                                    cache=qSonify.SongCache(str(tmp_path)))
+        _, port = await server.start()
+        post = lambda j: request(port, "POST", "/song", json.dumps(j).encode())
+        songs = [asyncio.ensure_future(post(job)) for _ in range(5)]
+        while server.metrics()["waiting"] < 5: await asyncio.sleep(.01)
+
+        status, _, body = await request(port, "GET", "/metrics")
+        metrics = json.loads(body.decode())
+        assert status == 200
+        assert metrics["queue_depth"] == 1 and metrics["waiting"] == 5
+
+        release.set()
+        responses = await asyncio.gather(*songs)
+        # served from the cache the second time, unless it is not seeded.
+        again = await post(job)
+        unseeded = [await post(dict(job, seed=None)) for _ in range(2)]
+
+        errors = [await post(dict(algorithm=["os(0)"])),
+                  await post(dict(job, colour=1)),
+                  await post(dict(job, name='x"\r\nSet-Cookie: a=1')),
+                  await post(dict(algorithm=[dict(name="QFT", args=[30])])),
+                  await post(dict(algorithm=["h(0)", "rz(pi, 11)"])),
+                  await post(dict(algorithm=["rz(9**9**9, 0)"])),
+                  await post(dict(job, num_samples=10**6)),
+                  await request(port, "POST", "/song", b"{"),
+                  await request(port, "GET", "/song"),
+                  await request(port, "GET", "/nope")]
+        metrics = server.metrics()
+        await server.close()
+        return responses, again, unseeded, errors, metrics
+
+    responses, again, unseeded, errors, metrics = asyncio.run(run())
+    midi = qSonify.alg_to_song(job["algorithm"], name="bell", seed=0).toBytes()
+    assert all(status == 200 and body == midi for status, _, body in responses)
+    assert sum("X-Coalesced: true" in head for _, head, _ in responses) == 4
+    assert again[0] == 200 and again[2] == midi
+    assert all(status == 200 for status, _, _ in unseeded)
+    assert [e[0] for e in errors] == [400] * 8 + [405, 404]
+    assert metrics["computed"] == 3 and metrics["coalesced"] == 4
+    assert metrics["cached"] == 1 and metrics["errors"] == 10
+    assert metrics["queue_depth"] == 0 and metrics["latency"]["count"] > 0